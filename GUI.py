@@ -4,14 +4,23 @@ from tkinter import NW, Canvas, PhotoImage, filedialog, ttk
 # Make sure Pillow is installed (pip install pillow)
 
 import os
+import queue
+import sqlite3
 import sys
+import threading
+import time
 
 import PIL
 from PIL import Image, ImageTk
-from buildStrings import APP_ICON, APP_IMAGE
+from buildStrings import APP_ICON, APP_IMAGE, RESULT_SORT_COLUMNS, RESULT_TABLE_PREFIX, RESULT_VIEWS
 
 icon_path = APP_ICON
 
+# number of rows fetched per page of the results pane
+RESULT_PAGE_SIZE = 200
+DEFAULT_RESULT_DB = "csvimported.db"
+SOURCE_SEPARATOR = ";"  # several source exports in one entry field
+
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -24,12 +33,296 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+class ResultsPane(ttk.Frame):
+    """
+    Virtualized preview of the result views. Rows are loaded lazily page by page
+    with keyset pagination (WHERE (sort key, rowid) > last row) while the user
+    scrolls; sorting (RESULT_SORT_COLUMNS) and filtering are done by SQLite.
+    Pages are read from the indexed result tables (RESULT_TABLE_PREFIX),
+    databases without them page the views with the whole row as the tie
+    breaker. Queries run in a worker thread so the GUI stays responsive on
+    large databases.
+    """
+
+    def __init__(self, parent, page_size=RESULT_PAGE_SIZE):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.db_path = None
+        self.source = None  # result table or view the pages are read from
+        self.keyed = False  # source has a rowid
+        self.columns = []
+        self.sort_column = None
+        self.sort_desc = False
+        self.last_key = None
+        self.exhausted = True
+        self.loading = False
+        self.generation = 0  # pages of an older query are dropped
+        self.polling = False  # one _poll_page loop at a time
+        self.rows_loaded = 0
+        self.pages = queue.Queue()
+
+        self.view_var = tk.StringVar(value=RESULT_VIEWS[0])
+        self.filter_var = tk.StringVar()
+        self.info_var = tk.StringVar()
+
+        toolbar = ttk.Frame(self)
+        toolbar.pack(fill=tk.X, pady=(0, 5))
+
+        ttk.Label(toolbar, text="View:").pack(side=tk.LEFT)
+        view_box = ttk.Combobox(toolbar, textvariable=self.view_var, values=RESULT_VIEWS,
+                                state="readonly", width=15)
+        view_box.pack(side=tk.LEFT, padx=(5, 15))
+        view_box.bind("<<ComboboxSelected>>", lambda e: self.reload())
+
+        ttk.Label(toolbar, text="Filter:").pack(side=tk.LEFT)
+        filter_entry = ttk.Entry(toolbar, textvariable=self.filter_var, width=25)
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        filter_entry.bind("<Return>", lambda e: self.reload())
+        ttk.Button(toolbar, text="Apply", command=self.reload).pack(side=tk.LEFT)
+
+        ttk.Label(toolbar, textvariable=self.info_var).pack(side=tk.RIGHT)
+
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.tree = ttk.Treeview(tree_frame, show="headings")
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL,
+                                       command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    def load(self, db_path):
+        """Show results of a finished run stored in db_path"""
+        self.db_path = db_path
+        self.sort_column = None
+        self.sort_desc = False
+        self.reload()
+
+    def reload(self):
+        """Drop loaded rows and start again from the first page"""
+        if not self.db_path or not os.path.isfile(self.db_path):
+            return
+
+        view = self.view_var.get()
+        try:
+            conn = self._connect()
+            try:
+                table = RESULT_TABLE_PREFIX + view
+                keyed = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                     (table,)).fetchone() is not None
+                source = table if keyed else view
+                cursor = conn.execute(f'SELECT * FROM "{source}" LIMIT 0')
+                columns = [d[0] for d in cursor.description]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.info_var.set(f"Cannot read {view}: {e}")
+            return
+        self.source = source
+        self.keyed = keyed
+
+        if columns != self.columns:
+            self.columns = columns
+            self.tree["columns"] = columns
+            for c in columns:
+                # only the indexed columns sort, the others would scan the table per page
+                if c in RESULT_SORT_COLUMNS:
+                    self.tree.heading(c, text=c, command=lambda c=c: self.sort_by(c))
+                else:
+                    self.tree.heading(c, text=c)
+                self.tree.column(c, width=120, stretch=True)
+            if self.sort_column not in columns:
+                self.sort_column = None
+
+        for c in columns:
+            arrow = ""
+            if c == self.sort_column:
+                arrow = " ▼" if self.sort_desc else " ▲"
+            self.tree.heading(c, text=c + arrow)
+
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.rows_loaded = 0
+        self.last_key = None
+        self.exhausted = False
+        self.loading = False
+        self._request_page()
+
+    def sort_by(self, column):
+        if self.sort_column == column:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_column = column
+            self.sort_desc = False
+        self.reload()
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def _key_columns(self):
+        # sort column first, rowid breaks ties (the rest of the row for views)
+        if self.keyed:
+            keys = []
+        else:
+            keys = [c for c in self.columns if c != self.sort_column]
+        if self.sort_column:
+            keys.insert(0, self.sort_column)
+        return keys
+
+    def _page_query(self):
+        # NULLs compare as '' so the keyset comparison is a total order,
+        # the same expression is indexed in the result tables
+        keys = [f'IFNULL("{c}", \'\')' for c in self._key_columns()]
+        if self.keyed:
+            keys.append("rowid")
+        direction = "DESC" if self.sort_desc else "ASC"
+
+        where = []
+        params = []
+        pattern = self.filter_var.get().strip()
+        if pattern:
+            where.append(
+                "(" + " OR ".join(f'"{c}" LIKE ?' for c in self.columns) + ")")
+            params += [f"%{pattern}%"] * len(self.columns)
+
+        if self.last_key is not None:
+            op = "<" if self.sort_desc else ">"
+            if len(keys) > 1:
+                # the bound on the sort key alone lets SQLite seek in its index
+                where.append(f"{keys[0]} {op}= ?")
+                params.append(self.last_key[0])
+            where.append(
+                f"({', '.join(keys)}) {op} ({', '.join('?' for _ in keys)})")
+            params += self.last_key
+
+        query = f'SELECT *{", rowid" if self.keyed else ""} FROM "{self.source}"'
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY " + ", ".join(f"{k} {direction}" for k in keys)
+        query += f" LIMIT {self.page_size}"
+        return query, params
+
+    def _request_page(self):
+        if self.loading or self.exhausted:
+            return
+        self.loading = True
+        self.info_var.set(f"{self.rows_loaded} rows, loading...")
+
+        query, params = self._page_query()
+        generation = self.generation
+
+        def worker():
+            try:
+                conn = self._connect()
+                try:
+                    rows = conn.execute(query, params).fetchall()
+                finally:
+                    conn.close()
+                self.pages.put((generation, rows, None))
+            except sqlite3.Error as e:
+                self.pages.put((generation, [], e))
+
+        threading.Thread(target=worker, daemon=True).start()
+        if not self.polling:
+            self.polling = True
+            self.after(20, self._poll_page)
+
+    def _poll_page(self):
+        # polls only while a page of the current query is awaited, results of
+        # replaced queries are dropped (or left for the next request to drop)
+        try:
+            generation, rows, error = self.pages.get_nowait()
+        except queue.Empty:
+            generation = None
+        if generation != self.generation:
+            if self.loading:
+                self.after(20, self._poll_page)
+            else:
+                self.polling = False
+            return
+
+        self.polling = False
+        self.loading = False
+        if error:
+            self.exhausted = True
+            self.info_var.set(f"Query failed: {error}")
+            return
+
+        width = len(self.columns)
+        for row in rows:
+            self.tree.insert("", tk.END, values=[
+                "" if v is None else v for v in row[:width]])
+        self.rows_loaded += len(rows)
+        self.exhausted = len(rows) < self.page_size
+
+        if rows:
+            keyIdx = [self.columns.index(c) for c in self._key_columns()]
+            self.last_key = ["" if rows[-1][i] is None else rows[-1][i]
+                             for i in keyIdx]
+            if self.keyed:
+                self.last_key.append(rows[-1][width])
+
+        more = "" if self.exhausted else "+"
+        self.info_var.set(f"{self.rows_loaded}{more} rows")
+
+        # fill the visible area if the first page does not need a scrollbar
+        if not self.exhausted and self.tree.yview()[1] >= 1.0:
+            self._request_page()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) > 0.9:
+            self._request_page()
+
+
+class PreviewWindow(tk.Toplevel):
+    """
+    Result of a preview run: estimated CZ/import totals per goods type with
+    95 % error bounds and the suppliers missing in the supplier list.
+    """
+
+    def __init__(self, parent, preview):
+        super().__init__(parent)
+        self.title("Preview")
+        self.geometry("760x480")
+
+        frame = ttk.Frame(self, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(frame, text=f"Estimated from {preview['sampled']} of {preview['rows']} rows "
+                              f"({preview['seconds']:.2f} s), ± is the 95 % error bound").pack(anchor=tk.W)
+
+        columns = ["Goods type", "Origin", "Plast [g]", "Papir [g]", "Lepenka [g]"]
+        estimates = ttk.Treeview(frame, columns=columns, show="headings", height=10)
+        for c in columns:
+            estimates.heading(c, text=c)
+            estimates.column(c, width=80 if c in columns[:2] else 170, stretch=True)
+        for goods_type, scope, bounds in preview["estimates"]:
+            estimates.insert("", tk.END, values=[goods_type, scope] +
+                             [f"{value:,.0f} ± {bound:,.0f}" for value, bound in bounds])
+        estimates.pack(fill=tk.BOTH, expand=True, pady=(5, 10))
+
+        unmatched = preview["unmatched"]
+        ttk.Label(frame, text=f"Suppliers not in the supplier list: {len(unmatched)}").pack(anchor=tk.W)
+        columns = ["Supplier", "Rows", "Quantity"]
+        suppliers = ttk.Treeview(frame, columns=columns, show="headings", height=6)
+        for c in columns:
+            suppliers.heading(c, text=c)
+            suppliers.column(c, width=400 if c == "Supplier" else 100, stretch=True)
+        for name, rows, quantity in unmatched:
+            suppliers.insert("", tk.END, values=[name, rows, f"{quantity:,.0f}"])
+        suppliers.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+
+        ttk.Button(frame, text="Close", command=self.destroy).pack(anchor=tk.E, pady=(10, 0))
+
+
 class CSVSelectorGUI:
-    def __init__(self, root, guiTitle, process_callback=None):
+    def __init__(self, root, guiTitle, process_callback=None, preview_callback=None):
         self.root = root
         self.root.title(guiTitle)
         self.selected_files = ()
-        self.root.geometry("600x500")
+        self.root.geometry("900x800")
 
         # Status bar
         self.status_var = tk.StringVar()
@@ -70,6 +363,9 @@ class CSVSelectorGUI:
 
         # Store the processing callback
         self.process_callback = process_callback
+        self.preview_callback = preview_callback
+        # the preview runs on a worker thread, its result is passed back here
+        self.previews = queue.Queue()
 
         # Variables to store file paths
         self.csv_file1 = tk.StringVar()
@@ -96,7 +392,7 @@ class CSVSelectorGUI:
         file1_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
         file1_button = ttk.Button(file1_frame, text="Browse...",
-                                  command=lambda: self.browse_file(self.csv_file1))
+                                  command=lambda: self.browse_file(self.csv_file1, multiple=True))
         file1_button.pack(side=tk.RIGHT, padx=(10, 0))
 
         # Second file selector
@@ -123,45 +419,116 @@ class CSVSelectorGUI:
                                          command=self.process_files)
         self.process_button.pack(side=tk.RIGHT, padx=5)
 
+        # Preview button - estimate from a sample before the full run
+        if preview_callback:
+            self.preview_button = ttk.Button(buttons_frame, text="Preview",
+                                             command=self.preview_files)
+            self.preview_button.pack(side=tk.RIGHT, padx=5)
+
         # Exit button
         self.exit_button = ttk.Button(buttons_frame, text="Exit",
                                       command=self.root.destroy)
         self.exit_button.pack(side=tk.RIGHT, padx=5)
 
+        # Results preview
+        results_frame = ttk.LabelFrame(main_frame, text="Results", padding="5")
+        results_frame.pack(fill=tk.BOTH, expand=True, pady=(20, 0))
+        self.results_pane = ResultsPane(results_frame)
+        self.results_pane.pack(fill=tk.BOTH, expand=True)
+
         status_bar = ttk.Label(
             root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
-    def browse_file(self, string_var):
-        """Open file dialog and store the selected path"""
-        filetypes = [("CSV files", "*.csv"), ("All files", "*.*")]
+    def browse_file(self, string_var, multiple=False):
+        """Open file dialog and store the selected path(s)"""
+        filetypes = [("CSV and Excel files", "*.csv *.csv.gz *.zip *.xlsx"),
+                     ("All files", "*.*")]
+        if multiple:
+            filenames = filedialog.askopenfilenames(title="Select CSV file(s)",
+                                                    filetypes=filetypes)
+            if filenames:
+                string_var.set(SOURCE_SEPARATOR.join(filenames))
+                self.status_var.set(
+                    f"Selected: {', '.join(os.path.basename(f) for f in filenames)}")
+            return
+
         filename = filedialog.askopenfilename(title="Select a CSV file",
                                               filetypes=filetypes)
         if filename:
             string_var.set(filename)
             self.status_var.set(f"Selected: {os.path.basename(filename)}")
 
-    def process_files(self):
-        """Handle the processing of selected files"""
+    def selected_inputs(self):
+        """(source path or list of paths, suppliers path), None if invalid"""
         file1 = self.csv_file1.get()
         file2 = self.csv_file2.get()
 
-        # Validate input
-        if not file1 or not os.path.isfile(file1):
+        # Validate input, the source may be several overlapping exports
+        sources = [f.strip() for f in file1.split(SOURCE_SEPARATOR) if f.strip()]
+        if not sources or not all(os.path.isfile(f) for f in sources):
             self.status_var.set("Error: First CSV file is invalid!")
-            return
+            return None
+        if len(sources) > 1:
+            file1 = sources
 
         if not file2 or not os.path.isfile(file2):
             self.status_var.set("Error: Second CSV file is invalid!")
+            return None
+        return file1, file2
+
+    def preview_files(self):
+        """Estimate the results from a sample of the selected files"""
+        inputs = self.selected_inputs()
+        if inputs is None:
             return
 
+        self.status_var.set("Sampling the source export...")
+        self.preview_button.config(state=tk.DISABLED)
+
+        def worker():
+            # sampling reads the whole export, keep the window responsive meanwhile
+            try:
+                self.previews.put((self.preview_callback(*inputs), None))
+            except Exception as e:
+                self.previews.put((None, e))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(50, self._poll_preview)
+
+    def _poll_preview(self):
+        try:
+            preview, error = self.previews.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self._poll_preview)
+            return
+
+        self.preview_button.config(state=tk.NORMAL)
+        if error is not None:
+            self.status_var.set(f"Error during preview: {str(error)}")
+            return
+        self.status_var.set(f"Preview: {preview['sampled']} of {preview['rows']} rows sampled, "
+                            f"{len(preview['unmatched'])} suppliers not matched")
+        PreviewWindow(self.root, preview)
+
+    def process_files(self):
+        """Handle the processing of selected files"""
+        inputs = self.selected_inputs()
+        if inputs is None:
+            return
+        file1, file2 = inputs
+
         self.status_var.set("Processing files...")
 
         # Call the processing callback if provided
         if self.process_callback:
             try:
-                self.process_callback(file1, file2)
+                result = self.process_callback(file1, file2)
                 self.status_var.set("Processing complete!")
+                # the callback may return the path of the result database
+                db_path = result if isinstance(
+                    result, str) else DEFAULT_RESULT_DB
+                self.results_pane.load(db_path)
             except Exception as e:
                 self.status_var.set(f"Error during processing: {str(e)}")
         else:
@@ -169,7 +536,8 @@ class CSVSelectorGUI:
             self.selected_files = (file1, file2)
 
 
-def runCSVguiProcessCallback(process_callback=None, guiTitle="CSVguiSelector"):
+def runCSVguiProcessCallback(process_callback=None, guiTitle="CSVguiSelector", preview_callback=None,
+                             ready_file=None):
     """
     Launch the GUI and either:
     - Return the selected CSV files (if process_callback is None)
@@ -177,13 +545,18 @@ def runCSVguiProcessCallback(process_callback=None, guiTitle="CSVguiSelector"):
 
     Args:
         process_callback: Function that takes two parameters (file1, file2)
-                         and processes the CSV files
+                         and processes the CSV files, it may return the path
+                         of the result database shown in the results pane
+        preview_callback: Function (file1, file2) returning a quick estimate
+                          (see main.previewDB), adds the Preview button
+        ready_file: start-up probe (buildExe.py --benchmark), once the window
+                    is built the time is written to this file and the GUI closes
 
     Returns:
         Tuple of file paths if no callback provided, otherwise None
     """
     root = tk.Tk()
-    app = CSVSelectorGUI(root, guiTitle, process_callback)
+    app = CSVSelectorGUI(root, guiTitle, process_callback, preview_callback)
 
     # Large image/icon display
     # Replace with your image file
@@ -208,6 +581,13 @@ def runCSVguiProcessCallback(process_callback=None, guiTitle="CSVguiSelector"):
     # img = PhotoImage(file=APP_IMAGE)
     # canvas.create_image(10, 10, anchor=NW, image=img)
 
+    if ready_file:
+        def ready():
+            with open(ready_file, "w") as probe:
+                probe.write(repr(time.time()))
+            root.destroy()
+        root.after_idle(ready)
+
     root.mainloop()
 
     # Return the selected files if the process button was pressed and no callback was provided
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the processing pipeline
+--------------------------------------
+scan    - times the memory-mapped scanner (fastScan.py) against csv.reader, the
+          equivalence of both is checked by tests/test_fastScan.py
+memory  - peak memory and top allocation sites per buildDB stage (memprofile.py),
+          exits with 1 when a stage exceeds its --budget
+
+Usage:
+    python benchmark.py scan Q1_25_M_Final.csv
+    python benchmark.py scan Q1_25_M_Final.csv --scale 2000 --repeat 3 --max-fields 16
+    python benchmark.py memory Q1_25_M_Final.csv dodavatele2.csv --scale 500 \
+        --budget ingest=300MB --budget xlsx=400MB
+"""
+
+import argparse
+import csv
+import itertools
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from charset_normalizer import from_path
+
+from fastScan import scanCsvBlocks
+from memprofile import MemoryProfiler, checkBudgets, formatReport, formatSize, parseBudgets
+
+BATCH_SIZE = 5000  # main.GInsertBatchSize
+
+
+def detect_encoding(path):
+    result = from_path(path).best()
+    return result.encoding if result and result.encoding else "utf8"
+
+
+def stream_csv_reader(path, encoding):
+    # consumed in insert batches like csvToSqlite did, returns the row count
+    count = 0
+    with open(path, "r", encoding=encoding) as file:
+        reader = csv.reader(file)
+        while True:
+            batch = list(itertools.islice(reader, BATCH_SIZE))
+            if not batch:
+                return count
+            count += len(batch)
+
+
+def stream_scanner(path, encoding, max_fields=None):
+    count = 0
+    for _, rows in scanCsvBlocks(path, encoding, maxFields=max_fields, withOffsets=False):
+        count += len(rows)
+    return count
+
+
+def scaled_copy(path, encoding, scale):
+    """Temporary file with the data rows of `path` repeated `scale` times."""
+    with open(path, "rb") as source:
+        header = source.readline()
+        body = source.read()
+    if body and not body.endswith(b"\n"):
+        body += b"\n"
+
+    fd, scaled = tempfile.mkstemp(prefix="bench_", suffix=".csv")
+    with os.fdopen(fd, "wb") as output:
+        output.write(header)
+        for _ in range(scale):
+            output.write(body)
+    return scaled
+
+
+def time_best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_scan(args):
+    encoding = args.encoding or detect_encoding(args.file)
+    print(f"File: {args.file} (encoding {encoding})")
+
+    path = args.file
+    if args.scale > 1:
+        path = scaled_copy(args.file, encoding, args.scale)
+    try:
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        reader_time, rows = time_best(
+            lambda: stream_csv_reader(path, encoding), args.repeat)
+        scanner_time, _ = time_best(
+            lambda: stream_scanner(path, encoding), args.repeat)
+        projected_time = None
+        if args.max_fields:
+            projected_time, _ = time_best(
+                lambda: stream_scanner(path, encoding, args.max_fields), args.repeat)
+    finally:
+        if path != args.file:
+            os.remove(path)
+
+    print(f"{rows} rows, {size_mb:.1f} MB, best of {args.repeat}")
+    print(f"  csv.reader: {reader_time:.3f} s")
+    print(f"  scanner:    {scanner_time:.3f} s ({reader_time / scanner_time:.2f}x)")
+    if projected_time is not None:
+        print(f"  scanner, first {args.max_fields} fields: {projected_time:.3f} s "
+              f"({reader_time / projected_time:.2f}x)")
+    return True
+
+
+def bench_memory(args):
+    budgets = parseBudgets(args.budget)
+    # main pulls in the GUI module, not needed for the scan benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+
+    encoding = detect_encoding(args.file)
+    path = args.file
+    if args.scale > 1:
+        path = scaled_copy(args.file, encoding, args.scale)
+    workdir = tempfile.mkdtemp(prefix="bench_memory_")
+    try:
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        with MemoryProfiler(topSites=args.top) as profiler:
+            # the pipeline prints its progress, keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                main.buildDB(path, args.suppliers, projected=args.projected, streaming=args.streaming,
+                             snapshotDb=None, outputDb=os.path.join(workdir, "bench.db"),
+                             outputXlsx=os.path.join(workdir, "bench.xlsx"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if path != args.file:
+            os.remove(path)
+
+    results = profiler.results()
+    print(f"File: {args.file} x{args.scale}, {size_mb:.1f} MB (encoding {encoding})")
+    if not profiler.hasRss:
+        print("psutil not installed: no RSS sampling, budgets apply to traced Python memory")
+    print(formatReport(results))
+
+    exceeded = checkBudgets(results, budgets)
+    for stage, used, budget in exceeded:
+        if used is None:
+            print(f"✗ budget for unknown stage '{stage}' (stages: {', '.join(r['name'] for r in results)})")
+        else:
+            print(f"✗ {stage}: peak {formatSize(used)} exceeds budget {formatSize(budget)}")
+    if budgets and not exceeded:
+        print(f"✓ all {len(budgets)} stage budgets met")
+    return not exceeded
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="CSV scanner vs csv.reader")
+    scan.add_argument("file", help="source CSV export")
+    scan.add_argument("--encoding", help="skip encoding detection")
+    scan.add_argument("--scale", type=int, default=1,
+                      help="repeat the data rows N times for the timing")
+    scan.add_argument("--max-fields", type=int,
+                      help="also time the scanner splitting only the first N fields (projected ingest)")
+    scan.add_argument("--repeat", type=int, default=3)
+    scan.set_defaults(run=bench_scan)
+
+    memory = commands.add_parser("memory", help="peak memory per pipeline stage")
+    memory.add_argument("file", help="source CSV export")
+    memory.add_argument("suppliers", help="suppliers list CSV")
+    memory.add_argument("--scale", type=int, default=1,
+                        help="repeat the data rows N times")
+    memory.add_argument("--budget", action="append", default=[], metavar="STAGE=SIZE",
+                        help="fail when the stage peak RSS exceeds SIZE (e.g. ingest=300MB), repeatable")
+    memory.add_argument("--top", type=int, default=5,
+                        help="allocation sites listed per stage")
+    memory.add_argument("--projected", action="store_true",
+                        help="ingest only the report columns")
+    memory.add_argument("--streaming", action="store_true",
+                        help="profile the streaming aggregation instead of the DB")
+    memory.set_defaults(run=bench_memory)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(0 if args.run(args) else 1)
@@ -6,14 +6,22 @@ This script automates the creation of a standalone executable from Python code.
 It handles installing PyInstaller if needed and runs the build process.
 
 Usage:
-    python buildExe.py
+    python buildExe.py                      # single-file build (original profile, dist/)
+    python buildExe.py --profile fast       # onedir fast-start build (dist-fast/)
+    python buildExe.py --profile all --benchmark --runs 10
+                                            # build both and compare start-up times
 """
 
+import argparse
+import csv
 import os
+import statistics
 import sys
 import subprocess
 import shutil
 import platform
+import tempfile
+import time
 from pathlib import Path
 
 # Configuration
@@ -23,6 +31,19 @@ from buildStrings import APP_VERSION
 from buildStrings import APP_ICON
 from buildStrings import EXTRA_DATA
 from buildStrings import INCLUDE_PACKAGES
+from buildStrings import FAST_EXCLUDE_MODULES
+from buildStrings import STARTUP_PROBE_ARG
+
+# Build profiles
+#   onefile - one executable, the whole bundle is unpacked to a temp dir on every launch
+#   fast    - onedir layout (nothing to unpack), optimized precompiled bytecode,
+#             no UPX decompression and unused PIL/openpyxl submodules excluded
+BUILD_PROFILES = {
+    "onefile": {"layout": "--onefile", "optimize": None, "noupx": False, "exclude": []},
+    "fast": {"layout": "--onedir", "optimize": 1, "noupx": True, "exclude": FAST_EXCLUDE_MODULES},
+}
+DEFAULT_PROFILE = "onefile"
+BENCHMARK_RESULTS = "startup_benchmark.csv"
 
 
 def check_pyinstaller():
@@ -61,9 +82,29 @@ def check_pyinstaller():
             return False
 
 
-def create_spec_file():
+def dist_path(profile):
+    # the default profile keeps the original dist/ location, the others get their own
+    # folder, so cleaning one profile's output leaves the other builds alone
+    return "dist" if profile == DEFAULT_PROFILE else f"dist-{profile}"
+
+
+def work_path(profile):
+    return "build" if profile == DEFAULT_PROFILE else f"build-{profile}"
+
+
+def executable_path(profile):
+    """Location of the built executable for the given profile."""
+    exe_extension = ".exe" if platform.system() == "Windows" else ""
+    exe_name = f"{APP_NAME}{exe_extension}"
+    if BUILD_PROFILES[profile]["layout"] == "--onedir":
+        return os.path.join(dist_path(profile), APP_NAME, exe_name)
+    return os.path.join(dist_path(profile), exe_name)
+
+
+def create_spec_file(profile=DEFAULT_PROFILE):
     """Create a spec file for PyInstaller with appropriate options."""
-    print("\nCreating spec file...")
+    print(f"\nCreating spec file (profile '{profile}')...")
+    options = BUILD_PROFILES[profile]
 
     # Base command with all needed options
     cmd = [
@@ -71,13 +112,25 @@ def create_spec_file():
         "-m",
         "PyInstaller",
         "--name", APP_NAME,
-        "--onefile",
+        options["layout"],
         "--windowed",
         "--clean",  # Clean PyInstaller cache
+        "--distpath", dist_path(profile),
+        "--workpath", work_path(profile),
         "--add-data", f"{APP_ICON};.",
         "--add-data", f"{APP_IMAGE};."
     ]
 
+    if options["optimize"] is not None:
+        # bytecode in the bundle is compiled at build time with this level
+        cmd.extend(["--optimize", str(options["optimize"])])
+
+    if options["noupx"]:
+        cmd.append("--noupx")
+
+    for module in options["exclude"]:
+        cmd.extend(["--exclude-module", module])
+
     # Add icon if specified
     if APP_ICON and os.path.exists(APP_ICON):
         cmd.extend(["--icon", APP_ICON])
@@ -130,7 +183,7 @@ def modify_spec_file():
     return True
 
 
-def build_executable():
+def build_executable(profile=DEFAULT_PROFILE):
     """Build the executable using the spec file."""
     spec_file = f"{APP_NAME}.spec"
 
@@ -146,6 +199,8 @@ def build_executable():
             "-m",
             "PyInstaller",
             "--clean",  # Clean PyInstaller cache
+            "--distpath", dist_path(profile),
+            "--workpath", work_path(profile),
             spec_file
         ]
 
@@ -153,15 +208,18 @@ def build_executable():
         print(f"Running command: {' '.join(cmd)}")
 
         subprocess.check_call(cmd)
-        print(f"✓ Executable built successfully! It's located in the 'dist' folder.")
+        print(f"✓ Executable built successfully! It's located in the '{dist_path(profile)}' folder.")
 
         # Get the executable path
-        exe_extension = ".exe" if platform.system() == "Windows" else ""
-        exe_path = os.path.join("dist", f"{APP_NAME}{exe_extension}")
+        exe_path = executable_path(profile)
 
         if os.path.exists(exe_path):
-            size_mb = os.path.getsize(exe_path) / (1024 * 1024)
-            print(f"  - Executable size: {size_mb:.2f} MB")
+            if BUILD_PROFILES[profile]["layout"] == "--onedir":
+                bundle = os.path.dirname(exe_path)
+                size = sum(f.stat().st_size for f in Path(bundle).rglob("*") if f.is_file())
+            else:
+                size = os.path.getsize(exe_path)
+            print(f"  - Bundle size: {size / (1024 * 1024):.2f} MB")
             print(f"  - Location: {os.path.abspath(exe_path)}")
         return True
     except subprocess.CalledProcessError as e:
@@ -169,10 +227,86 @@ def build_executable():
         return False
 
 
+def measure_startup(exe_path):
+    """
+    Launch the executable in headless probe mode once.
+    Returns (time_to_ready, time_to_exit) in seconds; ready is the moment
+    the GUI window is built and the event loop runs.
+    """
+    fd, probe_file = tempfile.mkstemp(prefix="startup_probe_", suffix=".txt")
+    os.close(fd)
+    try:
+        start = time.time()
+        subprocess.run([exe_path, STARTUP_PROBE_ARG, probe_file], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        exited = time.time()
+        with open(probe_file, "r") as probe:
+            ready = float(probe.read().strip())
+        return ready - start, exited - start
+    finally:
+        os.remove(probe_file)
+
+
+def benchmark_startup(profiles, runs=5):
+    """Measure cold start of the built profiles and append results to BENCHMARK_RESULTS."""
+    print("\nMeasuring start-up time...")
+    results = []
+    for profile in profiles:
+        exe_path = executable_path(profile)
+        if not os.path.exists(exe_path):
+            print(f"✗ '{exe_path}' not found, build profile '{profile}' first.")
+            return False
+
+        for run in range(1, runs + 1):
+            try:
+                ready, exited = measure_startup(exe_path)
+            except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                print(f"✗ Start-up probe of '{profile}' failed: {e}")
+                return False
+            results.append((profile, run, ready, exited))
+
+        ready_times = [r[2] for r in results if r[0] == profile]
+        print(f"  - {profile}: time-to-ready median {statistics.median(ready_times):.3f} s, "
+              f"min {min(ready_times):.3f} s ({runs} runs)")
+
+    new_file = not os.path.exists(BENCHMARK_RESULTS)
+    with open(BENCHMARK_RESULTS, "a", newline="", encoding="utf8") as output:
+        writer = csv.writer(output)
+        if new_file:
+            writer.writerow(["timestamp", "version", "profile", "run",
+                             "time_to_ready_s", "time_to_exit_s"])
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        for profile, run, ready, exited in results:
+            writer.writerow([stamp, APP_VERSION, profile, run,
+                             f"{ready:.4f}", f"{exited:.4f}"])
+
+    print(f"✓ Results appended to '{BENCHMARK_RESULTS}'.")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=f"Build {APP_NAME} executable")
+    parser.add_argument("--profile", choices=list(BUILD_PROFILES) + ["all"], default=DEFAULT_PROFILE,
+                        help="build profile, 'all' builds every profile")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="measure start-up time of the built profile(s)")
+    parser.add_argument("--skip-build", action="store_true",
+                        help="only run the benchmark on already built artifacts")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="number of launches per profile for the benchmark")
+    return parser.parse_args()
+
+
 def main():
     """Main build process."""
+    args = parse_args()
+    profiles = list(BUILD_PROFILES) if args.profile == "all" else [args.profile]
+
+    if args.skip_build:
+        return benchmark_startup(profiles, args.runs)
+
     print("=" * 60)
-    print(f"Building {APP_NAME} v{APP_VERSION}")
+    print(f"Building {APP_NAME} v{APP_VERSION} ({', '.join(profiles)})")
     print("=" * 60)
 
     # Check for main script
@@ -186,7 +320,7 @@ def main():
 
     # Clean up old build files if they exist
     print("\nCleaning up old build files...")
-    for folder in ['build', 'dist']:
+    for folder in [f(p) for p in profiles for f in (work_path, dist_path)]:
         if os.path.exists(folder):
             try:
                 shutil.rmtree(folder)
@@ -203,12 +337,16 @@ def main():
         except Exception as e:
             print(f"! Warning: Could not remove {spec_file} file: {e}")
 
-    # Create a new spec file
-    if not create_spec_file():
-        return False
+    for profile in profiles:
+        # Create a new spec file
+        if not create_spec_file(profile):
+            return False
+
+        # Build the executable
+        if not build_executable(profile):
+            return False
 
-    # Build the executable
-    if not build_executable():
+    if args.benchmark and not benchmark_startup(profiles, args.runs):
         return False
 
     print("\n" + "=" * 60)
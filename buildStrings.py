@@ -4,7 +4,29 @@ APP_NAME = "marian_deserved"  # Name of your application
 APP_VERSION = "1.0.0"
 APP_ICON = "AuthyAuthor.ico"  # Path to .ico file (optional)
 APP_IMAGE = "AuthorBetter2.png"  # Path to .ico file (optional)
+# Result views shown in the GUI results pane. buildDB copies them into tables
+# RESULT_TABLE_PREFIX + view with an index per RESULT_SORT_COLUMNS column, the
+# pane pages those tables and sorts by these columns only.
+RESULT_VIEWS = ["ekokom_res", "ekokom_CZ", "ekokom_import"]
+RESULT_TABLE_PREFIX = "results_"
+RESULT_SORT_COLUMNS = ["Dodavatel", "Typ_zbozi", "total_amount"]
 # List of tuples: (source_path, dest_dir_in_exe)
 # EXTRA_DATA = ["E:/Windows/Users/samue/OneDrive/source/repos/python/marian-deserved/AuthyAuthor.ico"]
 EXTRA_DATA = []
 INCLUDE_PACKAGES = []  # Any packages that PyInstaller might miss
+# Modules left out of the fast-start build (never imported by the app), keeps the
+# onedir bundle small. PIL plugins are imported lazily and ImportError is ignored.
+FAST_EXCLUDE_MODULES = [
+    "PIL.ImageQt", "PIL.ImageShow", "PIL.ImageGrab", "PIL.ImageCms", "PIL.ImageFont",
+    "PIL.ImageMath", "PIL.ImageMorph", "PIL.ImageDraw2", "PIL.PSDraw", "PIL.features",
+    "PIL.report", "PIL._imagingcms", "PIL._imagingft", "PIL._imagingmath", "PIL._imagingmorph",
+    "PIL._webp", "PIL._avif", "PIL.WebPImagePlugin", "PIL.AvifImagePlugin",
+    "PIL.Jpeg2KImagePlugin", "PIL.PdfImagePlugin", "PIL.PdfParser", "PIL.EpsImagePlugin",
+    "PIL.FpxImagePlugin", "PIL.MicImagePlugin", "PIL.SpiderImagePlugin", "PIL.WmfImagePlugin",
+    "PIL.IcnsImagePlugin", "PIL.TiffImagePlugin", "PIL.MpoImagePlugin", "PIL.JpegImagePlugin",
+    "openpyxl.utils.dataframe", "openpyxl.worksheet.ole", "openpyxl.worksheet.picture",
+    "openpyxl.worksheet.controls", "openpyxl.worksheet.custom", "openpyxl.worksheet.cell_watch",
+    "openpyxl.worksheet.smart_tag", "openpyxl.worksheet.errors",
+    "pandas",
+]
+STARTUP_PROBE_ARG = "--startup-probe"  # start-up probe run by the startup benchmark
@@ -0,0 +1,196 @@
+"""
+Memory-mapped CSV scanner
+-------------------------
+Most rows of the ERP export have no quoted fields. The file is memory-mapped and
+read in blocks of whole lines; every line is split on the delimiter directly and
+only lines containing a quote character go through csv.reader. Produces the same
+rows as csv.reader over the file opened in text mode (tests/test_fastScan.py).
+"""
+
+import codecs
+import csv
+import itertools
+import mmap
+import os
+
+GBlockSize = 1 << 20  # bytes decoded and split at once
+
+
+def isAsciiCompatible(encoding):
+    # delimiter, quote and newline bytes must be plain ASCII (utf-8, cp1250, ...)
+    try:
+        return codecs.encode('a,"\r\n', encoding) == b'a,"\r\n'
+    except LookupError:
+        return False
+
+
+class _RecordLines:
+    """
+    Lines of the mapped file from `pos` for csv.reader, which takes lines until
+    its record is complete. Lines end at \n, \r\n or a stray \r and are passed with
+    a \n ending, like a file opened in text mode (universal newlines).
+    """
+
+    def __init__(self, mm, buffer, encoding):
+        self.mm = mm
+        self.buffer = buffer
+        self.encoding = encoding
+        self.pos = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        size = len(self.mm)
+        if self.pos >= size:
+            raise StopIteration
+        end = self.mm.find(b"\n", self.pos)
+        stray = self.mm.find(b"\r", self.pos, size if end == -1 else end)
+        if stray != -1 and stray + 1 != end:
+            content, lineNext = stray, stray + 1
+        elif end == -1:
+            content = lineNext = size
+        else:
+            content, lineNext = end - (stray != -1), end + 1
+        line = str(self.buffer[self.pos:content], self.encoding)
+        self.pos = lineNext
+        return line + "\n" if content < size else line
+
+
+def _splitBlock(block, start, encoding, delimiter, maxSplit, withOffsets, allCRLF):
+    """
+    (offsets, rows) of a block of whole lines. Lines are split directly, the ones
+    with quotes are parsed again by one csv.reader call. Returns None when a quoted
+    field spans lines (the caller scans the block line by line).
+    """
+    text = str(block, encoding)
+    if allCRLF:
+        lines = text.split("\r\n")
+    else:
+        lines = text.replace("\r\n", "\n").split("\n")
+    if block.endswith(b"\n"):
+        lines.pop()
+
+    rows = [line.split(delimiter, maxSplit) for line in lines]
+
+    if "" in lines:
+        # csv.reader returns an empty row for an empty line
+        for i, line in enumerate(lines):
+            if not line:
+                rows[i] = []
+
+    if '"' in text:
+        quotedIdx = [i for i, line in enumerate(lines) if '"' in line]
+        # the extra line is swallowed if the last quoted field is not closed
+        quotedRows = list(csv.reader(
+            [lines[i] for i in quotedIdx] + ["end"], delimiter=delimiter))
+        # fewer rows than lines: a quoted field continued on the next line
+        if len(quotedRows) != len(quotedIdx) + 1:
+            return None
+        for i, row in zip(quotedIdx, quotedRows):
+            rows[i] = row
+
+    if not withOffsets:
+        return None, rows
+
+    lengths = map(len, block.split(b"\n"))
+    offsets = list(itertools.accumulate(
+        map((1).__add__, lengths), initial=start))[:len(rows)]
+    return offsets, rows
+
+
+def _scanLines(mm, buffer, pos, stop, encoding, delimiter, maxSplit):
+    """
+    Line by line scan of [pos, stop), a quoted record may end after stop.
+    Returns (offsets, rows, position after the last record).
+    """
+    size = len(mm)
+    offsets = []
+    rows = []
+    lines = _RecordLines(mm, buffer, encoding)
+    reader = csv.reader(lines, delimiter=delimiter)
+    while pos < stop:
+        end = mm.find(b"\n", pos)
+        lineNext = size if end == -1 else end + 1
+        content = size if end == -1 else end
+        if content > pos and mm[content - 1] == 13:  # \r\n
+            content -= 1
+
+        # no quotes and no stray \r: split the line directly
+        if mm.find(b'"', pos, content) == -1 and mm.find(b"\r", pos, content) == -1:
+            offsets.append(pos)
+            if content == pos:
+                rows.append([])
+            else:
+                rows.append(
+                    str(buffer[pos:content], encoding).split(delimiter, maxSplit))
+            pos = lineNext
+            continue
+
+        # csv.reader decides where the record ends: a quote opens a quoted field
+        # only at the start of a field, the field may continue on following lines
+        lines.pos = pos
+        offsets.append(pos)
+        rows.append(next(reader))
+        pos = lines.pos
+    return offsets, rows, pos
+
+
+def scanCsvBlocks(path, encoding, delimiter=",", maxFields=None, withOffsets=True, blockSize=GBlockSize):
+    """
+    Yield (offsets, rows) per block of the file, offsets[i] is the byte offset of
+    the first byte of rows[i] (offsets is None without withOffsets). Requires an
+    ASCII compatible encoding.
+    maxFields: only the first maxFields fields are needed (projected ingest), the
+               rest of an unquoted line is left unsplit in the last item
+    """
+    for offsets, rows, _ in scanCsvBlockRanges(path, encoding, delimiter, maxFields, withOffsets, blockSize):
+        yield offsets, rows
+
+
+def scanCsvBlockRanges(path, encoding, delimiter=",", maxFields=None, withOffsets=True, blockSize=GBlockSize,
+                       start=0):
+    """
+    scanCsvBlocks from byte offset `start` (a record boundary, e.g. the end of a
+    block scanned before), yields (offsets, rows, byte offset after the block).
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buffer = memoryview(mm)
+            maxSplit = -1 if maxFields is None else maxFields
+            try:
+                size = len(mm)
+                pos = start
+                while pos < size:
+                    # block ends after the last newline within blockSize
+                    end = mm.rfind(b"\n", pos, min(pos + blockSize, size))
+                    if end == -1:
+                        end = mm.find(b"\n", pos)
+                    blockEnd = size if end == -1 or pos + blockSize >= size else end + 1
+
+                    block = mm[pos:blockEnd]
+                    result = None
+                    # stray \r (not part of \r\n) is a line break for csv.reader in text mode
+                    crlf = block.count(b"\r\n") if b"\r" in block else 0
+                    if block.count(b"\r") == crlf:
+                        result = _splitBlock(block, pos, encoding, delimiter, maxSplit, withOffsets,
+                                             crlf == block.count(b"\n"))
+
+                    if result is not None:
+                        pos = blockEnd
+                        yield result + (pos,)
+                    else:
+                        offsets, rows, pos = _scanLines(
+                            mm, buffer, pos, blockEnd, encoding, delimiter, maxSplit)
+                        yield (offsets if withOffsets else None), rows, pos
+            finally:
+                buffer.release()
+
+
+def scanCsv(path, encoding, delimiter=",", maxFields=None, blockSize=GBlockSize):
+    """Yield (byteOffset, row) pairs like main.readCsvWithOffsets."""
+    for offsets, rows in scanCsvBlocks(path, encoding, delimiter, maxFields, True, blockSize):
+        yield from zip(offsets, rows)
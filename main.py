@@ -1,15 +1,38 @@
+import contextlib
 import csv
+import datetime
+import errno
+import gzip
+import hashlib
+import io
+import itertools
+import math
+import multiprocessing
+import operator
 import sqlite3
 import sys
 import os
+import random
+import re
+import shutil
+import string
+import tempfile
+import time
 import unicodedata
-from charset_normalizer import from_path
+import zipfile
+from charset_normalizer import from_bytes, from_path
 from openpyxl import Workbook
 from openpyxl import load_workbook
 import openpyxl.styles
 import openpyxl.utils
+from openpyxl.cell import WriteOnlyCell
 
 from GUI import runCSVguiProcessCallback
+from fastScan import isAsciiCompatible, scanCsv, scanCsvBlockRanges
+from memprofile import profileStage
+from buildStrings import RESULT_SORT_COLUMNS, RESULT_TABLE_PREFIX, RESULT_VIEWS, STARTUP_PROBE_ARG
+from snapshots import GScopeFilters, GScopes, GSnapshotDb, inputHash, openSnapshotStore, periodFromDates, saveSnapshot
+from supplierRegistry import GRegistryDb, openRegistry, registerSuppliers, resolveNames, supplierRows
 
 GDataTypesCZECH = {
     "datum": "TEXT",
@@ -27,6 +50,11 @@ GSqlGoodsTypeStrs = {'Obleceni': 'oble', 'Boty': 'boty',
                      'Kosmetika': 'kosme', 'Kabelky': 'kabel'}
 
 GCartonWeight = 1235e-6  # 1235 g = 1.235 kg
+
+# exact integer mode: weights in milligrams, quantities in thousandths of a piece
+GMilligramsPerTonne = 10**9
+GQuantityScale = 1000
+GCartonWeightMg = round(GCartonWeight * GMilligramsPerTonne)
 GgoodsCoefficients = {
     "Obleceni": {"plast": 13e-6, "papir": 0, "lepenka": 40},
     "Boty": {"plast": 0, "papir": 270e-6, "lepenka": 8},
@@ -43,6 +71,41 @@ GcoefficientsSimple = [
 
 # Grequired_cols = ["Dodavatel", "Typ_zbozi", "Množství celkem"]
 
+# source columns the report stages actually read (projected ingest):
+#   zbozi_puvod / zbozi_podle_typu -> Dodavatel, Typ_zbozi, Množství celkem
+#   period tagging                 -> Datum
+GReportColumns = ["Dodavatel", "Typ_zbozi", "Množství celkem", "Datum"]
+# only tag the snapshot period, an export without them gets period None
+GOptionalReportColumns = ["Datum"]
+GSourceOffsetColumn = "_offset"
+GSourceColumn = "_source"
+GSourceFilesTable = "sourceFiles"
+
+# a document of the ERP export, the same document can be in several exports
+GDedupeKeyColumns = ["Interní číslo", "Doklad (VS)"]
+GInsertBatchSize = 5000
+# buildDB commits the ingest and records where to resume every GCheckpointBatches batches
+GCheckpointBatches = 20
+GCheckpointSourcesTable = "checkpointSources"
+GCheckpointStagesTable = "checkpointStages"
+# ERP exports may arrive compressed, see openSourceBinary
+GCompressedExtensions = (".gz", ".zip")
+GEncodingSampleSize = 1 << 20  # decompressed bytes given to charset_normalizer
+# exports and supplier lists saved from Excel, see readXlsxRows
+GXlsxExtensions = (".xlsx", ".xlsm")
+GXlsxDateFormat = "%d/%m/%Y"  # Datum as the CSV exports write it
+
+# results of a run, see buildDB / runWorkspace
+GOutputDb = "csvimported.db"
+GOutputXlsx = "ekokom.xlsx"
+GWorkspacePrefix = ".ekokom-run-"
+GWorkspaceLock = "run.lock"  # SQLite file locked by the run using a keyed workspace
+GWorkspaceOwner = "output"  # output path of a keyed workspace, see pruneWorkspaces
+GPreviewSampleSize = 2000  # rows kept by previewDB
+# split export (WriteSplitToXLSX) for results beyond the rows of one sheet
+GXlsxMaxRows = 1048576  # Excel sheet limit
+GSummarySheet = "souhrn"
+
 
 class GoodsType:
     def __init__(self, name, filterStr, plast=0, papir=0, lepenka=0):
@@ -58,6 +121,13 @@ class GoodsType:
     def ToStrList(self):
         return [self.name, str(self.plast), str(self.papir), str(self.lepenka)]
 
+    def ToIntList(self):
+        # coefficients pre-scaled once: mg per piece, pieces per carton * GQuantityScale
+        return [self.name,
+                round(self.plast * GMilligramsPerTonne),
+                round(self.papir * GMilligramsPerTonne),
+                round(self.lepenka * GQuantityScale)]
+
 
 # Convert the dictionary to a list of GoodsType instances
 GgoodsList = [
@@ -80,112 +150,957 @@ def removeDiacritics(instr):
     return res
 
 
-def createDBoverwrite():
-    # Step 1: Connect to SQLite database (creates one if it doesn't exist)
-    dbName = "csvimported.db"
+def openCheckpointedDB(dbName):
+    """
+    Database of a run workspace with the checkpoint tables, the database left by
+    an interrupted run with the same inputs is reopened and the run resumes.
+    """
     if os.path.exists(dbName):
-        print(f"{dbName} file exists, removing...")
-        os.remove(dbName)
-
+        print(f"{dbName} exists, resuming the interrupted run...")
     conn = sqlite3.connect(dbName)
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {GCheckpointSourcesTable} (
+            id INTEGER PRIMARY KEY,
+            path TEXT,
+            position INTEGER,
+            rows INTEGER,
+            done INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS {GCheckpointStagesTable} (
+            stage TEXT PRIMARY KEY,
+            completed TEXT
+        );
+    """)
     return conn
 
 
-def csvToSqlite(cursor, sourceCsv, suppliersCountryCsv):
-    encoding_sourceCsv = "utf8"
-    encoding_suppliersCountryCsv = "utf8"
+def stageDone(cursor, stage):
+    return cursor.execute(f"SELECT 1 FROM {GCheckpointStagesTable} WHERE stage = ?",
+                          (stage,)).fetchone() is not None
+
+
+def markStageDone(cursor, stage):
+    # commits the work of the stage together with its checkpoint
+    cursor.execute(f"INSERT OR REPLACE INTO {GCheckpointStagesTable} VALUES (?, ?)",
+                   (stage, datetime.datetime.now().isoformat(timespec="seconds")))
+    cursor.connection.commit()
+
+
+def sourceCheckpoint(cursor, sourceId):
+    # (position to resume reading at, rows committed, done) or None
+    return cursor.execute(f"SELECT position, rows, done FROM {GCheckpointSourcesTable} WHERE id = ?",
+                          (sourceId,)).fetchone()
+
+
+def saveSourceCheckpoint(cursor, sourceId, path, position, rows, done=False):
+    # commits the inserted batches together with the position after them
+    cursor.execute(f"INSERT OR REPLACE INTO {GCheckpointSourcesTable} VALUES (?, ?, ?, ?, ?)",
+                   (sourceId, os.path.abspath(path), position, rows, int(done)))
+    cursor.connection.commit()
+
+
+def isCompressed(path):
+    return path.lower().endswith(GCompressedExtensions)
+
+
+def openSourceBinary(path):
+    """
+    Binary stream of a source export: the file itself, or decompressed on the fly
+    for .csv.gz and .zip (the single CSV member), nothing is extracted to disk.
+    """
+    lowerPath = path.lower()
+    if lowerPath.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if lowerPath.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            members = [m for m in archive.infolist() if not m.is_dir()]
+            csvMembers = [m for m in members if m.filename.lower().endswith(".csv")]
+            if len(csvMembers) == 1:
+                member = csvMembers[0]
+            elif len(members) == 1:
+                member = members[0]
+            else:
+                raise ValueError(
+                    f"Archive '{path}' must contain exactly one CSV file, found {[m.filename for m in members]}")
+            # the member keeps the archive file open after the ZipFile is closed
+            return archive.open(member)
+    return open(path, "rb")
+
+
+def isXlsx(path):
+    return path.lower().endswith(GXlsxExtensions)
+
+
+def openSourceText(path, encoding):
+    # same newline handling as open(path, "r") for compressed inputs
+    if isCompressed(path):
+        return io.TextIOWrapper(openSourceBinary(path), encoding=encoding)
+    return open(path, "r", encoding=encoding)
+
+
+def detectEncoding(path, default="utf8"):
+    # charset_normalizer guess, falls back to `default`; None for workbooks (cells are text)
+    if isXlsx(path):
+        return None
     try:
-        result = from_path(sourceCsv).best()
-        if result and result.encoding:
-            encoding_sourceCsv = result.encoding
+        if isCompressed(path):
+            # guess from the decompressed head, cut at a line end so a multi-byte
+            # character is not split
+            with openSourceBinary(path) as file:
+                head = file.read(GEncodingSampleSize)
+            if len(head) == GEncodingSampleSize and b"\n" in head:
+                head = head[:head.rindex(b"\n") + 1]
+            result = from_bytes(head).best()
         else:
-            print(f'error encoding: no result')
-
-        result = from_path(suppliersCountryCsv).best()
+            result = from_path(path).best()
         if result and result.encoding:
-            encoding_suppliersCountryCsv = result.encoding
-        else:
-            print(f'error encoding: no result')
+            return result.encoding
+        print(f'error encoding: no result')
     except Exception:
         print('failed to check enconding, trying with UTF-8...')
+    return default
+
+
+def sqliteColumnName(header):
+    # Replace spaces with underscores, drop the UTF-8 BOM and diacritics
+    h1 = header.lstrip("\ufeff").replace(" ", "_")
+    return removeDiacritics(h1)
+
+
+def sqliteColumnType(header):
+    for name, type in GDataTypesCZECH.items():
+        if header.lower().find(name) != -1:
+            return type
+
+    # everything that is not easily identifiable is TEXT
+    return "TEXT"
+
+
+def readCsvRows(path, encoding, delimiter=","):
+    # (row index, row) pairs, same shape as readCsvWithOffsets
+    with openSourceText(path, encoding) as file:
+        yield from enumerate(csv.reader(file, delimiter=delimiter))
+
+
+def xlsxCellText(value):
+    # cell value as the CSV export writes it, the rest of the load sees only text
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.strftime(GXlsxDateFormat)
+        return value.strftime(f"{GXlsxDateFormat} %H:%M:%S")
+    if isinstance(value, datetime.date):
+        return value.strftime(GXlsxDateFormat)
+    return str(value)
+
+
+def readXlsxRows(path):
+    """
+    (row index, row) of the first sheet of a workbook, same shape as readCsvRows.
+    The read-only workbook parses the sheet XML as the rows are consumed, the
+    workbook is never loaded whole. Rows are padded or cut to the header width
+    (cells right of the header, e.g. notes, are dropped), empty rows are skipped;
+    the index (sheet row - 1) is the offset kept by keepOffsets.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        width = None
+        for index, values in enumerate(workbook.worksheets[0].iter_rows(values_only=True)):
+            row = [xlsxCellText(v) for v in values]
+            if width is None:
+                while row and not row[-1]:
+                    row.pop()
+                width = len(row)
+            else:
+                row = row[:width] + [""] * (width - len(row))
+                if not any(row):
+                    continue
+            yield index, row
+    finally:
+        workbook.close()
+
+
+def readSourceRows(path, encoding, delimiter=","):
+    # (row index, row) of a CSV export or a workbook
+    if isXlsx(path):
+        return readXlsxRows(path)
+    return readCsvRows(path, encoding, delimiter)
+
+
+def readCsvWithOffsets(path, encoding, delimiter=",", start=None):
+    """
+    Yield (byteOffset, row) for every record of the CSV file, the offset
+    points at the first byte of the record. Works for ASCII compatible
+    encodings (utf-8, cp1250, ...) where b"\\n" always ends a line.
+    Offsets of compressed inputs are positions in the decompressed data.
+    start: offset of a record to begin at instead of the header
+    """
+    with openSourceBinary(path) as file:
+        nextOffset = 0
+        if start is not None:
+            file.seek(start)
+            nextOffset = start
+
+        def lines():
+            nonlocal nextOffset
+            for raw in file:
+                nextOffset += len(raw)
+                yield raw.decode(encoding)
+
+        # csv.reader pulls lines lazily, so `nextOffset` read before next()
+        # is the start of the record it is going to return
+        reader = csv.reader(lines(), delimiter=delimiter)
+        while True:
+            start = nextOffset
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            yield start, row
+
+
+def fetchSourceRow(cursor, offset, sourceId=1):
+    """
+    Lazily load the full source row stored at `offset` of file `sourceId`
+    (_offset and _source columns written by a projected ingest) for drill-down.
+    Returns dict {original header: value}.
+    """
+    path, encoding = cursor.execute(
+        f"SELECT path, encoding FROM {GSourceFilesTable} WHERE id = ?", (sourceId,)).fetchone()
+
+    if isXlsx(path):
+        rows = readXlsxRows(path)
+        try:
+            _, headers = next(rows)
+            row = next(row for index, row in rows if index == offset)
+        finally:
+            rows.close()
+        return dict(zip(headers, row))
+
+    # a compressed input is decompressed again up to the offset
+    with openSourceBinary(path) as file:
+        headers = next(csv.reader([file.readline().decode(encoding)]))
+        headers = [h.lstrip("\ufeff") for h in headers]
+        file.seek(offset)
+        row = next(csv.reader(raw.decode(encoding) for raw in file))
+
+    return dict(zip(headers, row))
+
+
+def readSuppliersCsv(suppliersCountryCsv, encoding=None):
+    """(normalized column names, rows) of the supplier list, encoding detected if not given."""
+    if encoding is None:
+        encoding = detectEncoding(suppliersCountryCsv)
+    try:
+        # read suppliers table
+        supplierCsvReader = readSourceRows(suppliersCountryCsv, encoding, delimiter=";")
+        _, supplierheader = next(supplierCsvReader)
+
+        columnsSup = []
+        for s in supplierheader:
+            s = s.replace(" ", "_")
+            normalized = removeDiacritics(s)
+            # DEBUG print
+            print(f"{s} -> {normalized}")
+            columnsSup.append(normalized)
+
+        return columnsSup, [row for _, row in supplierCsvReader]
+    except UnicodeDecodeError as e:
+        raise ValueError(
+            f"Failed to decode file '{suppliersCountryCsv}' with encoding '{encoding}'.") from e
+
+
+def createSuppliersTable(cursor, columnsSup, rows):
+    # rows: (rowid, values), rowid is the supplier row number
+    supplierTableName = "suppliersCountry"
+    queryCreateSuppTable = f'CREATE TABLE IF NOT EXISTS {supplierTableName} ({", ".join(columnsSup)})'
+    cursor.execute(queryCreateSuppTable)
+
+    supplierValues = ", ".join(["?" for _ in columnsSup])
+    # DEBUG print header
+    # print(f"supplierValues: {supplierValues}")
+    queryInsertSup = (
+        f"INSERT INTO {supplierTableName} (rowid, {', '.join(columnsSup)}) VALUES (?, {supplierValues})"
+    )
+
+    for rowNo, row in rows:
+        cursor.execute(queryInsertSup, [rowNo] + row)
+
+
+def loadSuppliersCsv(cursor, suppliersCountryCsv, encoding):
+    columnsSup, rows = readSuppliersCsv(suppliersCountryCsv, encoding)
+    createSuppliersTable(cursor, columnsSup, enumerate(rows, start=1))
+
+
+def loadSuppliersFromRegistry(cursor, suppliersCountryCsv, registryDb):
+    """
+    suppliersCountry from the supplier registry (supplierRegistry.py) and the
+    supplierMatches table (product Dodavatel -> suppliersCountry rowid) for the
+    names in suppliedProducts, only names new to the registry are matched.
+    """
+    registry = openRegistry(registryDb)
+    try:
+        versionId = registerSuppliers(
+            registry, suppliersCountryCsv, readSuppliersCsv)
+        columnsSup, rows = supplierRows(registry, versionId)
+        names = [n for n, in cursor.execute(
+            "SELECT DISTINCT Dodavatel FROM suppliedProducts")]
+        matches, resolved = resolveNames(registry, versionId, names)
+    finally:
+        registry.close()
+
+    createSuppliersTable(cursor, columnsSup, rows)
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS supplierMatches (Dodavatel TEXT, supplier_row INTEGER)")
+    cursor.executemany("INSERT INTO supplierMatches VALUES (?, ?)", matches)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS supplierMatches_name ON supplierMatches(Dodavatel, supplier_row)")
+    print(f"Suppliers: {len(names) - resolved} names from the registry cache, {resolved} resolved")
+
+
+def loadSourceCsv(cursor, sourceCsv, encoding, columns=None, keepOffsets=False, sourceId=1, dedupe=False,
+                  fastScan=True, checkpoints=False):
+    """
+    Load one source export into suppliedProducts, the table is created by the
+    first file. Rows are inserted in batches of GInsertBatchSize; with dedupe
+    the insert is an UPSERT on the GDedupeKeyColumns unique index, so a document
+    present in several exports is stored once (the last loaded file wins).
+    fastScan reads the file through the memory-mapped scanner (fastScan.py),
+    compressed inputs (.csv.gz, .zip) are decompressed into csv.reader instead,
+    workbooks (.xlsx) are streamed by readXlsxRows.
+    With checkpoints the batches are committed every GCheckpointBatches together
+    with the position after them (byte offset, row index on the csv.reader and
+    workbook path without keepOffsets), a file interrupted before is read on from
+    the last checkpoint.
+    """
+    productsTableName = "suppliedProducts"
+
+    checkpoint = sourceCheckpoint(cursor, sourceId) if checkpoints else None
+    if checkpoint and checkpoint[2]:
+        print(f"{os.path.basename(sourceCsv)}: {checkpoint[1]} rows loaded by the interrupted run")
+        return
+    start, committedRows = checkpoint[:2] if checkpoint else (None, 0)
+    if checkpoint:
+        print(f"{os.path.basename(sourceCsv)}: resuming after {committedRows} committed rows")
+
+    # Step 2: Read the CSV file
+    useScanner = fastScan and canScan(sourceCsv, encoding)
+    if useScanner:
+        # header only, the rows are read in blocks below
+        importedCSVreader = scanCsv(sourceCsv, encoding)
+    else:
+        importedCSVreader = readSourceRows(sourceCsv, encoding)
+
+    # Get column headers from first row
+    _, headers = next(importedCSVreader)
+    headers = [h.lstrip("\ufeff") for h in headers]
+    importedCSVreader.close()
+
+    # projected ingest: the columns we keep, dedupe needs the document key too
+    if columns is None:
+        columns = headers
+    elif dedupe:
+        columns = list(columns) + \
+            [k for k in GDedupeKeyColumns if k not in columns]
+
+    # the first file defines the table, later ones need at least the columns the
+    # report reads and the document key, the rest stays empty when missing
+    if sourceId == 1:
+        required = [c for c in columns if c not in GOptionalReportColumns]
+    else:
+        required = [c for c in GReportColumns if c not in GOptionalReportColumns] + (
+            GDedupeKeyColumns if dedupe else [])
+    missing = [c for c in required if c not in headers]
+    if missing:
+        raise ValueError(
+            f"Source file '{sourceCsv}' is missing columns {missing}")
+
+    # Step 3: Create table dynamically based on CSV headers
+    # Replace spaces with underscores and handle special characters if needed
+    if sourceId == 1:
+        columnsDef = [
+            f'"{sqliteColumnName(c)}" {sqliteColumnType(c)}' for c in columns]
+        if keepOffsets:
+            columnsDef.append(f'"{GSourceColumn}" INTEGER')
+            columnsDef.append(f'"{GSourceOffsetColumn}" INTEGER')
+
+        queryCreateTable = (
+            f'CREATE TABLE IF NOT EXISTS {productsTableName} ({", ".join(columnsDef)})'
+        )
+
+        # DEBUG print sqlite types
+        # print(f"queryCreateTable: {queryCreateTable}")
+        cursor.execute(queryCreateTable)
+
+        if dedupe:
+            keyColumns = ", ".join(
+                f'"{sqliteColumnName(k)}"' for k in GDedupeKeyColumns)
+            cursor.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {productsTableName}_document ON {productsTableName} ({keyColumns})")
+
+        if keepOffsets:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {GSourceFilesTable} (id INTEGER PRIMARY KEY, path TEXT, encoding TEXT)")
+
+    if keepOffsets:
+        cursor.execute(f"INSERT OR REPLACE INTO {GSourceFilesTable} (id, path, encoding) VALUES (?, ?, ?)",
+                       (sourceId, os.path.abspath(sourceCsv), encoding))
+
+    # later files may have the columns in a different order or miss some
+    tableColumns = [r[1] for r in cursor.execute(
+        f'PRAGMA table_info({productsTableName})')]
+    keep = [(headers.index(c), sqliteColumnName(c)) for c in columns
+            if c in headers and sqliteColumnName(c) in tableColumns]
+    keepIdx = [i for i, _ in keep]
+    insertColumns = [f'"{name}"' for _, name in keep]
+    if keepOffsets:
+        insertColumns += [f'"{GSourceColumn}"', f'"{GSourceOffsetColumn}"']
+
+    # Step 4: Prepare INSERT query
+    placeholders = ", ".join(["?" for _ in insertColumns])
+    queryInsert = f"INSERT INTO {productsTableName} ({', '.join(insertColumns)}) VALUES ({placeholders})"
+    if dedupe:
+        keyColumns = [f'"{sqliteColumnName(k)}"' for k in GDedupeKeyColumns]
+        updates = [f"{c} = excluded.{c}" for c in insertColumns
+                   if c not in keyColumns]
+        queryInsert += f" ON CONFLICT ({', '.join(keyColumns)}) DO " + \
+            (f"UPDATE SET {', '.join(updates)}" if updates else "NOTHING")
+
+    # Step 5: Insert CSV data into the table, batches come with the position to resume at
+    if useScanner:
+        batches = scannedBatches(sourceCsv, encoding, keepIdx, len(headers),
+                                 sourceId if keepOffsets else None, start)
+    else:
+        if keepOffsets and not isXlsx(sourceCsv):
+            records = readCsvWithOffsets(sourceCsv, encoding, start=start)
+        else:
+            records = readSourceRows(sourceCsv, encoding)
+            if start is not None:
+                # row index: the rows before it are parsed again, not inserted
+                records = itertools.dropwhile(lambda r: r[0] < start, records)
+        if start is None:
+            next(records)  # header
+        batches = recordBatches(records, keepIdx, len(headers),
+                                sourceId if keepOffsets else None)
+
+    for batchNo, (batch, position) in enumerate(batches, start=1):
+        cursor.executemany(queryInsert, batch)
+        committedRows += len(batch)
+        if checkpoints and position is not None and batchNo % GCheckpointBatches == 0:
+            saveSourceCheckpoint(cursor, sourceId, sourceCsv,
+                                 position, committedRows)
+
+    if checkpoints:
+        saveSourceCheckpoint(cursor, sourceId, sourceCsv,
+                             None, committedRows, done=True)
+
+
+def canScan(path, encoding):
+    # the scanner maps the file, it needs a plain CSV file in an ASCII compatible encoding
+    return not isCompressed(path) and not isXlsx(path) and isAsciiCompatible(encoding)
+
+
+def scannedBatches(sourceCsv, encoding, keepIdx, numColumns, sourceId=None, start=None):
+    """
+    Insert batches straight from the blocks of the memory-mapped scanner, header
+    row skipped, each with the byte offset after its block. Only the fields up to
+    the last kept column are split. With sourceId every row gets (sourceId, byte
+    offset) appended. start: offset returned with an earlier batch to resume at.
+    """
+    allColumns = keepIdx == list(range(numColumns))
+    maxFields = None if allColumns else max(keepIdx) + 1
+    getter = operator.itemgetter(*keepIdx)
+
+    first = start is None
+    for offsets, rows, end in scanCsvBlockRanges(sourceCsv, encoding, maxFields=maxFields,
+                                                 withOffsets=sourceId is not None, start=start or 0):
+        if first:
+            rows = rows[1:]
+            offsets = offsets[1:] if offsets else offsets
+            first = False
+
+        if sourceId is not None:
+            yield [[row[i] for i in keepIdx] + [sourceId, offset] for offset, row in zip(offsets, rows)], end
+        elif allColumns:
+            yield rows, end
+        elif len(keepIdx) == 1:
+            yield [[row[keepIdx[0]]] for row in rows], end
+        else:
+            yield list(map(getter, rows)), end
+
+
+def recordBatches(records, keepIdx, numColumns, sourceId=None):
+    """
+    Insert batches of GInsertBatchSize from the (position, row) records of the
+    csv.reader or workbook path, each with the position of the record following
+    it (None after the last batch). With sourceId every row gets (sourceId,
+    position) appended.
+    """
+    allColumns = keepIdx == list(range(numColumns))
+    batch = list(itertools.islice(records, GInsertBatchSize))
+    while batch:
+        following = list(itertools.islice(records, GInsertBatchSize))
+        if sourceId is not None:
+            rows = [[row[i] for i in keepIdx] + [sourceId, position] for position, row in batch]
+        elif allColumns:
+            rows = [row for _, row in batch]
+        else:
+            rows = [[row[i] for i in keepIdx] for _, row in batch]
+        yield rows, following[0][0] if following else None
+        batch = following
+
+
+def csvToSqlite(cursor, sourceCsv, suppliersCountryCsv, columns=None, keepOffsets=False, dedupe=False,
+                fastScan=True, registryDb=None, checkpoints=False):
+    """
+    Import the source export into suppliedProducts and the supplier list into suppliersCountry.
+
+    sourceCsv: path or list of paths (e.g. overlapping monthly and quarterly exports)
+    columns: optional list of source headers (e.g. GReportColumns) - projected ingest,
+             only these fields are parsed into the table, the rest of the row is skipped
+    keepOffsets: store byte offset of every record in the _offset column so the
+                 full row can be fetched later with fetchSourceRow()
+    dedupe: key suppliedProducts on GDedupeKeyColumns and UPSERT, every document
+            is counted once no matter how many exports contain it
+    fastScan: memory-mapped scanner with a fast path for unquoted lines, falls back
+              to csv.reader for encodings that are not ASCII compatible
+    registryDb: take the supplier list from the supplier registry and add the
+                supplierMatches table (see loadSuppliersFromRegistry)
+    checkpoints: commit the ingest in steps recorded in the checkpoint tables
+                 (see openCheckpointedDB), the supplier list and the batches
+                 recorded by an interrupted run are not loaded again
+    """
+    sourceCsvs = [sourceCsv] if isinstance(sourceCsv, str) else list(sourceCsv)
+    loadSuppliers = not (checkpoints and stageDone(cursor, "suppliers"))
+
+    if not registryDb and loadSuppliers:
+        loadSuppliersCsv(cursor, suppliersCountryCsv,
+                         detectEncoding(suppliersCountryCsv))
+        if checkpoints:
+            markStageDone(cursor, "suppliers")
+
+    for sourceId, path in enumerate(sourceCsvs, start=1):
+        encoding_sourceCsv = detectEncoding(path)
+        try:
+            loadSourceCsv(cursor, path, encoding_sourceCsv, columns,
+                          keepOffsets, sourceId, dedupe, fastScan, checkpoints)
+        except UnicodeDecodeError as e:
+            raise ValueError(
+                f"Failed to decode file '{path}' with encoding '{encoding_sourceCsv}'.") from e
+
+    if registryDb and loadSuppliers:
+        loadSuppliersFromRegistry(cursor, suppliersCountryCsv, registryDb)
+        if checkpoints:
+            markStageDone(cursor, "suppliers")
+
+
+# ================================================================================================= #
+# streaming aggregation - same results as the SQL views without storing the rows
+# ================================================================================================= #
+GAsciiLower = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+# SQLite >= 3.43 sums REAL values with Kahan-Babuska-Neumaier compensation
+GSqliteCompensatedSum = sqlite3.sqlite_version_info >= (3, 43, 0)
+
+
+def sqlLikeMatcher(pattern):
+    """
+    Predicate for `value LIKE '%' || pattern || '%'` with SQLite semantics:
+    case-insensitive for ASCII letters only, % and _ are wildcards in pattern.
+    """
+    if pattern is None:
+        return lambda value: False
+
+    pattern = pattern.translate(GAsciiLower)
+    if "%" not in pattern and "_" not in pattern:
+        return lambda value: value is not None and pattern in value.translate(GAsciiLower)
+
+    regex = re.compile(".*".join(".".join(re.escape(p) for p in part.split("_"))
+                                 for part in pattern.split("%")), re.DOTALL)
+    return lambda value: value is not None and regex.search(value.translate(GAsciiLower)) is not None
+
+
+# numeric prefix SQLite reads from text, e.g. "1,5" -> 1 and "12 ks" -> 12
+GSqlRealPrefix = re.compile(r"[ \t\n\v\f\r]*([+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)")
+
+
+def sqlReal(value):
+    # REAL affinity of Mnozstvi_celkem: text that is not a number is stored as text
+    # and SUM() reads its numeric prefix, 0.0 when there is none
+    match = GSqlRealPrefix.match(value)
+    return float(match.group(1)) if match else 0.0
+
+
+def sqlSumStep(acc, value):
+    """Add value to acc = [sum, error] the way SQLite SUM() accumulates REAL values."""
+    if not GSqliteCompensatedSum:
+        acc[0] += value
+        return
+    s = acc[0]
+    t = s + value
+    if abs(s) > abs(value):
+        acc[1] += (s - t) + value
+    else:
+        acc[1] += (value - t) + s
+    acc[0] = t
+
+
+def sqlSumAdd(acc, value):
+    """
+    SUM() accumulator after adding value: None while there is nothing to sum, an
+    int while only integers were added (exact like SQLite), else [sum, error].
+    """
+    if value is None:
+        return acc
+    if isinstance(value, int) and (acc is None or isinstance(acc, int)):
+        return (acc or 0) + value
+    if not isinstance(acc, list):
+        acc = [float(acc or 0), 0.0]
+    sqlSumStep(acc, value)
+    return acc
+
+
+def sqlSumValue(acc):
+    return acc[0] + acc[1] if isinstance(acc, list) else acc
+
+
+def sqlSum(values):
+    # SUM() over a column: NULLs skipped, NULL when there is nothing to sum
+    acc = None
+    for v in values:
+        acc = sqlSumAdd(acc, v)
+    return sqlSumValue(acc)
+
+
+def readSourceColumns(sourceCsv, columns, fastScan=True, optional=()):
+    """
+    Yield lists of the `columns` values of every row of one source export,
+    columns in `optional` missing in the export are None.
+    """
+    encoding = detectEncoding(sourceCsv)
+    useScanner = fastScan and canScan(sourceCsv, encoding)
+    if useScanner:
+        _, headers = next(scanCsv(sourceCsv, encoding))
+    else:
+        _, headers = next(readSourceRows(sourceCsv, encoding))
+    headers = [h.lstrip("\ufeff") for h in headers]
+
+    missing = [c for c in columns if c not in headers and c not in optional]
+    if missing:
+        raise ValueError(
+            f"Source file '{sourceCsv}' is missing columns {missing}")
+    present = [c for c in columns if c in headers]
+    keepIdx = [headers.index(c) for c in present]
+    # positions of the requested columns in the read values, None when absent
+    slots = None
+    if len(present) != len(columns):
+        slots = [present.index(c) if c in present else None for c in columns]
+
+    def expand(values):
+        return values if slots is None else [None if i is None else values[i] for i in slots]
+
+    try:
+        if useScanner:
+            for batch, _ in scannedBatches(sourceCsv, encoding, keepIdx, len(headers)):
+                yield from map(expand, batch)
+        else:
+            rows = readSourceRows(sourceCsv, encoding)
+            next(rows)
+            for _, row in rows:
+                yield expand([row[i] for i in keepIdx])
+    except UnicodeDecodeError as e:
+        raise ValueError(
+            f"Failed to decode file '{sourceCsv}' with encoding '{encoding}'.") from e
+
 
+def aggregateCsvStreaming(sourceCsv, suppliersCountryCsv, fastScan=True, dates=None):
+    """
+    Single pass over the export(s) summing quantities per (goods type, Dodavatel,
+    _CZ_ano_ne) while reading, like the zbozi_podle_typu view over the LIKE join
+    of suppliedProducts and suppliersCountry. Nothing is stored per row, memory
+    grows with the number of groups and distinct supplier / goods names only.
+
+    Returns {(goods type, Dodavatel, _CZ_ano_ne): [sum, sum error, Typ_zbozi]},
+    goods type is the lowercase GoodsType name, Typ_zbozi of the first row of the
+    group like SQLite picks the bare column, rows without a type are skipped
+    (ekokom_res drops them).
+    dates: optional set collecting the distinct Datum values (snapshot period)
+    """
+    sourceCsvs = [sourceCsv] if isinstance(sourceCsv, str) else list(sourceCsv)
+    supplierCountries = supplierCountryResolver(suppliersCountryCsv)
+    goodsTypeOf = goodsTypeResolver()
+    groups = {}
+
+    columns = GReportColumns if dates is not None else GReportColumns[:3]
+    for path in sourceCsvs:
+        for supplier, goods, amount, *date in readSourceColumns(path, columns, fastScan,
+                                                                GOptionalReportColumns):
+            if date and date[0] is not None:
+                dates.add(date[0])
+            goodsType = goodsTypeOf(goods)
+            if goodsType is None:
+                continue
+
+            amount = sqlReal(amount)
+            for country in supplierCountries(supplier):
+                group = groups.get((goodsType, supplier, country))
+                if group is None:
+                    group = [0.0, 0.0, goods]
+                    groups[(goodsType, supplier, country)] = group
+                sqlSumStep(group, amount)
+
+    return groups
+
+
+def supplierCountryResolver(suppliersCountryCsv):
+    """
+    Function Dodavatel -> [_CZ_ano_ne of every supplier row matching like the
+    zbozi_puvod LIKE join], cached per name.
+    """
+    # supplier list: (LIKE matcher of Dodavel, _CZ_ano_ne) in file order
+    encoding = detectEncoding(suppliersCountryCsv)
     try:
-        with open(suppliersCountryCsv, "r", encoding=encoding_suppliersCountryCsv) as supplierList:
-            # Step 2: Read the CSV file
-            with open(sourceCsv, "r", encoding=encoding_sourceCsv) as file:
-                importedCSVreader = csv.reader(file)
-                # Get column headers from first row
-                headers = next(importedCSVreader)
-
-                # read suppliers table
-                supplierCsvReader = csv.reader(supplierList, delimiter=";")
-                supplierheader = next(supplierCsvReader)
-
-                supplierTableName = "suppliersCountry"
-                columnsSup = []
-                for s in supplierheader:
-                    s = s.replace(" ", "_")
-                    normalized = removeDiacritics(s)
-                    # DEBUG print
-                    print(f"{s} -> {normalized}")
-                    columnsSup.append(normalized)
-
-                queryCreateSuppTable = f'CREATE TABLE IF NOT EXISTS {supplierTableName} ({", ".join(columnsSup)})'
-                cursor.execute(queryCreateSuppTable)
-
-                supplierValues = ", ".join(["?" for _ in supplierheader])
-                # DEBUG print header
-                # print(f"supplierValues: {supplierValues}")
-                queryInsertSup = (
-                    f"INSERT INTO {supplierTableName} VALUES ({supplierValues})"
-                )
-
-                for row in supplierCsvReader:
-                    cursor.execute(queryInsertSup, row)
-
-                sqliteDataTypes = []
-                # process header data types
-                for h in headers:
-                    typeFound = False
-                    for name, type in GDataTypesCZECH.items():
-                        if h.lower().find(name) != -1:
-                            sqliteDataTypes.append(type)
-                            typeFound = True
-                            break
-
-                    # everything that is not easily identifiable is TEXT
-                    if typeFound == False:
-                        sqliteDataTypes.append("TEXT")
-
-                # Step 3: Create table dynamically based on CSV headers
-                # Replace spaces with underscores and handle special characters if needed
-                columns = []
-                for i, h in enumerate(headers):
-                    h1 = h.replace(" ", "_")
-                    normalized = removeDiacritics(h1)
-                    # DEBUG print
-                    # print(f"{h} -> {h1} -> {normalized}")
-                    columns.insert(i, f'"{normalized}" {sqliteDataTypes[i]}')
-
-                productsTableName = "suppliedProducts"
-                queryCreateTable = (
-                    f'CREATE TABLE IF NOT EXISTS {productsTableName} ({", ".join(columns)})'
-                )
-
-                # DEBUG print sqlite types
-                # print(f"queryCreateTable: {queryCreateTable}")
-                cursor.execute(queryCreateTable)
-
-                # Step 4: Prepare INSERT query
-                placeholders = ", ".join(["?" for _ in headers])
-                queryInsert = f"INSERT INTO {productsTableName} VALUES ({placeholders})"
-
-                # Step 5: Insert CSV data into the table
-                for row in importedCSVreader:
-                    cursor.execute(queryInsert, row)
+        supplierCsvReader = readSourceRows(suppliersCountryCsv, encoding, delimiter=";")
+        supplierheader = [sqliteColumnName(s)
+                          for s in next(supplierCsvReader)[1]]
+        nameIdx = supplierheader.index("Dodavel")
+        countryIdx = supplierheader.index("_CZ_ano_ne")
+        suppliers = [(sqlLikeMatcher(row[nameIdx]), row[countryIdx])
+                     for _, row in supplierCsvReader]
     except UnicodeDecodeError as e:
         raise ValueError(
-            f"Failed to decode files '{sourceCsv} & {suppliersCountryCsv}' with encoding '{encoding_sourceCsv}' & '{encoding_suppliersCountryCsv}'.") from e
+            f"Failed to decode file '{suppliersCountryCsv}' with encoding '{encoding}'.") from e
+
+    supplierCountries = {}
+
+    def resolve(supplier):
+        countries = supplierCountries.get(supplier)
+        if countries is None:
+            countries = [country for match,
+                         country in suppliers if match(supplier)]
+            supplierCountries[supplier] = countries
+        return countries
+    return resolve
+
+
+def goodsTypeResolver():
+    """Function Typ_zbozi -> lowercase goods type (first matching WHEN of the CASE) or None, cached."""
+    goodsMatchers = [(sqlLikeMatcher(t.filterStr), t.name.lower())
+                     for t in GgoodsList]
+    goodsTypes = {}
+
+    def resolve(goods):
+        goodsType = goodsTypes.get(goods, False)
+        if goodsType is False:
+            goodsType = next(
+                (name for match, name in goodsMatchers if match(goods)), None)
+            goodsTypes[goods] = goodsType
+        return goodsType
+    return resolve
+
+
+def streamingReportRows(groups):
+    """
+    ekokom_res rows (Dodavatel, Typ_zbozi, total_amount, PuvodCZ, Plast [g],
+    Papir [g], Lepenka [g]) from aggregateCsvStreaming groups, in the order
+    SQLite returns the view.
+    """
+    rows = []
+    # GROUP BY output order, then the coefficients join
+    for (goodsType, supplier, country), (total, error, goods) in sorted(groups.items()):
+        total = total + error
+        for t in GgoodsList:
+            if not sqlLikeMatcher(goodsType)(t.name):
+                continue
+            lepenka = None
+            if t.lepenka != 0:
+                lepenka = total / t.lepenka * GCartonWeight * 1E6
+            rows.append((supplier, goods, total, country,
+                         total * t.plast * 1E6,
+                         total * t.papir * 1E6,
+                         lepenka))
+    return rows
+
+
+def streamingTotals(rows):
+    # per goods type (ekokom_*<type> views) and overall (ekokom_total*) sums of the material columns
+    typeTotals = []
+    for t in GgoodsList:
+        match = sqlLikeMatcher(t.filterStr)
+        typeRows = [r for r in rows if match(r[1])]
+        typeTotals.append([tuple(sqlSum(r[c] for r in typeRows)
+                                 for c in (4, 5, 6))])
+    totals = [tuple(sqlSum(r[c] for r in rows) for c in (4, 5, 6))]
+    return typeTotals, totals
+
+
+def buildStreaming(sourceCsv, suppliersCountryCsv, outputXlsx=GOutputXlsx, fastScan=True, dates=None,
+                   xlsxRowLimit=None):
+    """
+    Fast path of buildDB for the standard report: aggregate while reading and
+    write ekokom.xlsx directly, no SQLite database is created.
+    xlsxRowLimit: write the split export (WriteSplitToXLSX) instead
+    Returns (ekokom_res rows, {"CZ": totals, "import": totals}).
+    """
+    with profileStage("aggregate"):
+        groups = aggregateCsvStreaming(
+            sourceCsv, suppliersCountryCsv, fastScan, dates)
+        rows = streamingReportRows(groups)
+    print(f"Aggregated {len(groups)} groups while reading the export")
+
+    matchCZ = sqlLikeMatcher(GScopeFilters["CZ"])
+    matchImport = sqlLikeMatcher(GScopeFilters["import"])
+    rowsCZ = [r for r in rows if matchCZ(r[3])]
+    rowsImport = [r for r in rows if matchImport(r[3])]
+
+    with profileStage("xlsx"):
+        typeTotals, totalsCZ = streamingTotals(rowsCZ)
+        typeTotalsImport, totalsImport = streamingTotals(rowsImport)
+        if xlsxRowLimit:
+            wb = Workbook(write_only=True)
+            WriteSplitToXLSX(wb, [("ekokom_CZ", rowsCZ, typeTotals, totalsCZ),
+                                  ("ekokom_import", rowsImport, typeTotalsImport, totalsImport)],
+                             xlsxRowLimit)
+        else:
+            wb = Workbook()
+            defaultSheet = wb.active
+            WriteRowsToXLSX(wb, "ekokom_CZ", rowsCZ, typeTotals, totalsCZ)
+            WriteRowsToXLSX(wb, "ekokom_import", rowsImport,
+                            typeTotalsImport, totalsImport)
+            wb.remove(defaultSheet)
+        wb.save(outputXlsx)
+    return rows, {"CZ": totalsCZ[0], "import": totalsImport[0]}
+
+
+def rowMaterials(goodsType, amount):
+    # (plast, papir, lepenka) grams of one row like ekokom_res, lepenka None without carton coefficient
+    for t in GgoodsList:
+        if t.name.lower() == goodsType:
+            lepenka = None
+            if t.lepenka != 0:
+                lepenka = amount / t.lepenka * GCartonWeight * 1E6
+            return (amount * t.plast * 1E6, amount * t.papir * 1E6, lepenka)
+    return (None, None, None)
+
+
+def previewDB(sourceCsv, suppliersCountryCsv, sampleSize=GPreviewSampleSize, seed=None, fastScan=True):
+    """
+    Quick sanity check before a full run: one pass over the export keeps a
+    reservoir sample of sampleSize rows, the sample goes through the same
+    supplier join and goods type grouping as the report and the CZ/import totals
+    are scaled to the whole export with 95 % error bounds (1.96 standard errors
+    of the estimated total). Suppliers matching no row of the supplier list are
+    counted over all rows, not estimated. Overlapping exports are not deduplicated.
+
+    Returns {"rows", "sampled", "seconds", "estimates", "unmatched"}:
+        estimates - [(goods type or "celkem", "CZ"/"import", [(grams, bound)] for plast, papir, lepenka)]
+        unmatched - [(Dodavatel, rows, quantity)], largest quantity first
+    """
+    start = time.perf_counter()
+    sourceCsvs = [sourceCsv] if isinstance(sourceCsv, str) else list(sourceCsv)
+    supplierCountries = supplierCountryResolver(suppliersCountryCsv)
+    goodsTypeOf = goodsTypeResolver()
+    rng = random.Random(seed)
+
+    # Algorithm R reservoir over the rows of all exports
+    sample = []
+    suppliers = {}  # Dodavatel -> [rows, quantity]
+    rowCount = 0
+    for path in sourceCsvs:
+        for row in readSourceColumns(path, GReportColumns[:3], fastScan):
+            counts = suppliers.get(row[0])
+            if counts is None:
+                counts = suppliers[row[0]] = [0, 0.0]
+            counts[0] += 1
+            counts[1] += sqlReal(row[2])
+
+            if rowCount < sampleSize:
+                sample.append(row)
+            else:
+                j = rng.randrange(rowCount + 1)
+                if j < sampleSize:
+                    sample[j] = row
+            rowCount += 1
+
+    scopes = [(scope, sqlLikeMatcher(GScopeFilters[scope])) for scope in GScopes]
+    cells = [(t.name.lower(), scope) for t in GgoodsList for scope, _ in scopes]
+    cells += [("celkem", scope) for scope, _ in scopes]
+    sums = {cell: [0.0] * 3 for cell in cells}
+    squares = {cell: [0.0] * 3 for cell in cells}
+
+    for supplier, goods, amount in sample:
+        goodsType = goodsTypeOf(goods)
+        if goodsType is None:
+            continue
+        materials = rowMaterials(goodsType, sqlReal(amount))
+        # contribution of the row to every cell, a supplier may match several rows
+        values = {}
+        for country in supplierCountries(supplier):
+            for scope, match in scopes:
+                if match(country):
+                    for cell in ((goodsType, scope), ("celkem", scope)):
+                        acc = values.setdefault(cell, [0.0] * 3)
+                        for i, m in enumerate(materials):
+                            acc[i] += m or 0.0
+        for cell, acc in values.items():
+            for i, v in enumerate(acc):
+                sums[cell][i] += v
+                squares[cell][i] += v * v
+
+    n = len(sample)
+    estimates = []
+    for cell in cells:
+        bounds = []
+        for total, square in zip(sums[cell], squares[cell]):
+            if n == 0:
+                bounds.append((0.0, 0.0))
+                continue
+            mean = total / n
+            variance = (square - n * mean * mean) / (n - 1) if n > 1 else 0.0
+            # finite population correction, the full sample has no error
+            se = rowCount * math.sqrt(max(variance, 0.0) / n * (1 - n / rowCount))
+            bounds.append((rowCount * mean, 1.96 * se))
+        estimates.append(cell + (bounds,))
+
+    unmatched = sorted(((name, c[0], c[1]) for name, c in suppliers.items()
+                        if not supplierCountries(name)), key=lambda u: -u[2])
+    return {"rows": rowCount, "sampled": n, "seconds": time.perf_counter() - start,
+            "estimates": estimates, "unmatched": unmatched}
+
+
+def saveRunSnapshot(snapshotDb, sourceCsv, suppliersCountryCsv, resRows, totals, dates, unit="g", period=None):
+    """
+    Store the ekokom_res rows and CZ/import totals of a run in the snapshot
+    history (snapshots.py), weights converted to grams, goods type named like
+    the GROUP BY CASE of zbozi_podle_typu.
+    """
+    sourceCsvs = [sourceCsv] if isinstance(sourceCsv, str) else list(sourceCsv)
+    toGrams = 1000 if unit == "mg" else 1
+
+    goodsMatchers = [(sqlLikeMatcher(t.filterStr), t.name.lower())
+                     for t in GgoodsList]
+    rows = []
+    for supplier, goods, amount, country, *materials in resRows:
+        goodsType = next(
+            (name for match, name in goodsMatchers if match(goods)), None)
+        rows.append((supplier, goodsType, country, amount) +
+                    tuple(None if m is None else m / toGrams for m in materials))
+    totals = {scope: tuple(None if m is None else m / toGrams for m in t)
+              for scope, t in totals.items()}
+
+    with profileStage("snapshot"):
+        conn = openSnapshotStore(snapshotDb)
+        try:
+            snapshotId = saveSnapshot(conn, period or periodFromDates(dates),
+                                      inputHash(
+                                          sourceCsvs + [suppliersCountryCsv], GgoodsList, GCartonWeight),
+                                      sourceCsvs, rows, totals)
+        finally:
+            conn.close()
+    print(f"Snapshot #{snapshotId} saved to {snapshotDb}")
+    return snapshotId
 
 
 def createCoeffsTable(cursor, goodsTypeStr, coeffsTable):
@@ -200,25 +1115,39 @@ def createCoeffsTable(cursor, goodsTypeStr, coeffsTable):
         cursor.execute(insertCoeffData, type.ToStrList())
 
 
-def calcViewTotals(sqlCursor, viewName, selectFrom):
+def createCoeffsTableInt(cursor, goodsTypeStr, coeffsTable):
+    # integer coefficients for the exact mode, parsed once at insert
+    queryCreateCoeffsTable = f"CREATE TABLE IF NOT EXISTS {coeffsTable} ({goodsTypeStr} TEXT, mg_plast INTEGER, mg_papir INTEGER, lepenka_scaled INTEGER)"
+    cursor.execute(queryCreateCoeffsTable)
+
+    insertCoeffData = f"INSERT INTO {coeffsTable} VALUES (?,?,?,?)"
+    cursor.executemany(insertCoeffData, [t.ToIntList() for t in GgoodsList])
+
+
+def sqlRoundDiv(num, den):
+    # integer division rounded half away from zero, stays in SQLite INTEGER arithmetic
+    return f"((2 * ({num}) + (CASE WHEN ({num}) < 0 THEN -1 ELSE 1 END) * ({den})) / (2 * ({den})))"
+
+
+def calcViewTotals(sqlCursor, viewName, selectFrom, unit="g"):
     resultViewQuery = f"""
     CREATE VIEW IF NOT EXISTS {viewName} AS
         SELECT
-            SUM(e.'Plast [g]') as 'Plasty celkem [g]',
-			SUM(e.'Papir [g]') as 'Papir celkem [g]',
-			SUM(e.'Lepenka [g]') as 'Lepenka celkem [g]'
+            SUM(e.'Plast [{unit}]') as 'Plasty celkem [{unit}]',
+			SUM(e.'Papir [{unit}]') as 'Papir celkem [{unit}]',
+			SUM(e.'Lepenka [{unit}]') as 'Lepenka celkem [{unit}]'
 		FROM {selectFrom} as e;
     """
     sqlCursor.execute(resultViewQuery)
 
 
-def calcViewTotalsPerType(sqlCursor, viewName, selectFrom, typeFilterStr):
+def calcViewTotalsPerType(sqlCursor, viewName, selectFrom, typeFilterStr, unit="g"):
     resultViewQuery = f"""
     CREATE VIEW IF NOT EXISTS {viewName} AS
         SELECT
-            SUM(e.'Plast [g]') as 'Plasty celkem [g]',
-			SUM(e.'Papir [g]') as 'Papir celkem [g]',
-			SUM(e.'Lepenka [g]') as 'Lepenka celkem [g]'
+            SUM(e.'Plast [{unit}]') as 'Plasty celkem [{unit}]',
+			SUM(e.'Papir [{unit}]') as 'Papir celkem [{unit}]',
+			SUM(e.'Lepenka [{unit}]') as 'Lepenka celkem [{unit}]'
 		FROM {selectFrom} as e
         WHERE e.Typ_zbozi LIKE '%{typeFilterStr}%';
     """
@@ -236,10 +1165,280 @@ def createFilterByCountryView(sqlCursor, viewName, selectFrom, filterString):
     sqlCursor.execute(materialsViewQuery)
 
 
-def buildDB(sourceCsv, suppliersCountryCsv):
-    conn = createDBoverwrite()
+def materializeResults(sqlCursor, resView, countryViews):
+    """
+    Copy the result views of the GUI results pane (RESULT_VIEWS) into tables
+    RESULT_TABLE_PREFIX + view, paging the views re-evaluated them for every page.
+    resView is copied first, countryViews {view: filterString} are filtered from
+    the copy like createFilterByCountryView. rowid keeps the view order, the
+    RESULT_SORT_COLUMNS get an index on the IFNULL(column, '') sort key of the
+    keyset pages.
+    """
+    resTable = RESULT_TABLE_PREFIX + resView
+    queries = {resView: f"SELECT * FROM {resView}"}
+    for view, filterString in countryViews.items():
+        queries[view] = f"SELECT * FROM {resTable} WHERE PuvodCZ LIKE '%{filterString}%'"
+
+    for view in RESULT_VIEWS:
+        table = RESULT_TABLE_PREFIX + view
+        # a resumed run may have copied some of them already
+        sqlCursor.execute(f"DROP TABLE IF EXISTS {table}")
+        sqlCursor.execute(f"CREATE TABLE {table} AS {queries[view]}")
+        for column in RESULT_SORT_COLUMNS:
+            sqlCursor.execute(
+                f"""CREATE INDEX {table}_{column} ON {table}(IFNULL("{column}", ''))""")
+
+
+def runKey(sourceCsvs, suppliersCountryCsv, scenariosCsv, options):
+    """
+    Workspace key of a DB run: the input files (path, size, modification time),
+    the coefficients and the options that change the outputs.
+    """
+    digest = hashlib.sha256()
+    for path in list(sourceCsvs) + [suppliersCountryCsv] + ([scenariosCsv] if scenariosCsv else []):
+        stat = os.stat(path)
+        digest.update(repr((os.path.abspath(path), stat.st_size, stat.st_mtime_ns)).encode())
+    digest.update(repr([(g.name, g.plast, g.papir, g.lepenka)
+                        for g in GgoodsList] + [GCartonWeight, options]).encode())
+    return digest.hexdigest()[:16]
+
+
+def lockWorkspace(workspace):
+    """
+    Exclusive lock of a keyed workspace, held until the returned connection is
+    closed; None when another run holds it. The OS drops the lock when the
+    process dies, a crashed run does not keep its workspace locked.
+    """
+    conn = sqlite3.connect(os.path.join(workspace, GWorkspaceLock), timeout=0, isolation_level=None)
+    try:
+        conn.execute("BEGIN EXCLUSIVE")
+    except sqlite3.OperationalError:
+        conn.close()
+        return None
+    return conn
+
+
+def pruneWorkspaces(parent, outputPath, current):
+    """
+    Remove the kept workspaces of outputPath other than `current`: their key
+    differs, the inputs or options changed and they can not be resumed.
+    Workspaces locked by a running build are left alone.
+    """
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if not name.startswith(GWorkspacePrefix) or path == current:
+            continue
+        try:
+            with open(os.path.join(path, GWorkspaceOwner), encoding="utf8") as file:
+                owner = file.read()
+        except OSError:
+            continue
+        if owner != os.path.abspath(outputPath):
+            continue
+        lock = lockWorkspace(path)
+        if lock is not None:
+            removeWorkspace(path, lock)
+
+
+@contextlib.contextmanager
+def runWorkspace(outputPath, key=None, resume=True):
+    """
+    Per-run directory next to outputPath (same filesystem, so the finished
+    outputs are moved into place by a rename). Without key it is unique and
+    removed with everything left in it. With key (runKey) it is named by the key,
+    locked for the run and kept when the run fails, the next run with the same
+    key resumes from it; resume=False empties it first. A run that finds the
+    keyed workspace locked by another run builds in a unique one. Removed once
+    the run succeeds or fails on its inputs (ValueError, the same inputs fail
+    again).
+    """
+    parent = os.path.dirname(os.path.abspath(outputPath))
+    lock = None
+    if key is not None:
+        workspace = os.path.join(parent, GWorkspacePrefix + key)
+        os.makedirs(workspace, exist_ok=True)
+        lock = lockWorkspace(workspace)
+        if lock is None:
+            print(f"{workspace} is used by another run with the same inputs, building in a new workspace")
+        else:
+            if not resume:
+                clearWorkspace(workspace)
+            with open(os.path.join(workspace, GWorkspaceOwner), "w", encoding="utf8") as file:
+                file.write(os.path.abspath(outputPath))
+            pruneWorkspaces(parent, outputPath, workspace)
+    if lock is None:
+        workspace = tempfile.mkdtemp(prefix=GWorkspacePrefix, dir=parent)
+
+    try:
+        yield workspace
+    except ValueError:
+        removeWorkspace(workspace, lock)
+        raise
+    except BaseException:
+        if lock is None:
+            shutil.rmtree(workspace, ignore_errors=True)
+        else:
+            lock.close()
+        raise
+    removeWorkspace(workspace, lock)
+
+
+def clearWorkspace(workspace):
+    # everything but the lock file of a locked workspace
+    for name in os.listdir(workspace):
+        if not name.startswith(GWorkspaceLock):
+            path = os.path.join(workspace, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+
+def removeWorkspace(workspace, lock):
+    """
+    Remove a workspace, a keyed one while its lock is still held: a run locking
+    it after the lock is released must not lose its files.
+    """
+    if lock is None:
+        shutil.rmtree(workspace, ignore_errors=True)
+        return
+    # moved aside while locked, a run starting now gets a fresh workspace
+    trash = tempfile.mkdtemp(prefix=GWorkspacePrefix, dir=os.path.dirname(workspace))
+    try:
+        os.replace(workspace, os.path.join(trash, "done"))
+    except OSError:
+        # on Windows the open lock file prevents the rename: emptied while locked,
+        # the lock file and the directory go only if no other run took them
+        os.rmdir(trash)
+        try:
+            clearWorkspace(workspace)
+        finally:
+            lock.close()
+        with contextlib.suppress(OSError):
+            for name in os.listdir(workspace):
+                if name.startswith(GWorkspaceLock):
+                    os.remove(os.path.join(workspace, name))
+            os.rmdir(workspace)
+        return
+    lock.close()
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def publishOutput(stagedPath, finalPath):
+    """Move a finished output over finalPath atomically, readers see the old or the new file."""
+    try:
+        os.replace(stagedPath, finalPath)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # other filesystem: copy next to finalPath first, the rename there is atomic
+        fd, partPath = tempfile.mkstemp(prefix=".", suffix=".part",
+                                        dir=os.path.dirname(os.path.abspath(finalPath)))
+        os.close(fd)
+        shutil.copyfile(stagedPath, partPath)
+        os.replace(partPath, finalPath)
+
+
+def buildDB(sourceCsv, suppliersCountryCsv, projected=False, keepOffsets=False, scenariosCsv=None, dedupe=None,
+            exactIntegers=False, fastScan=True, streaming=False, snapshotDb=GSnapshotDb, period=None,
+            outputDb=GOutputDb, outputXlsx=GOutputXlsx, registryDb=GRegistryDb, statementsDir=None, resume=True,
+            xlsxRowLimit=None):
+    """
+    sourceCsv: path or list of paths of source exports
+    dedupe: count every document (GDedupeKeyColumns) once across the exports,
+            default on when more than one export is given
+    exactIntegers: compute weights in integer milligrams (fixed point) instead of
+                   float grams, totals are exact and identical on every platform
+    fastScan: read the export with the memory-mapped scanner (fastScan.py)
+    streaming: aggregate while reading and write ekokom.xlsx without building the
+               database (see buildStreaming), returns None as there is no DB
+    projected: ingest only GReportColumns instead of the whole export
+    keepOffsets: keep source byte offsets for drill-down (see fetchSourceRow)
+    scenariosCsv: optional file with alternative coefficient sets, adds a
+                  comparison sheet to ekokom.xlsx (see scenarios.py)
+    snapshotDb: snapshot history the results are added to (see snapshots.py),
+                None to skip
+    period: snapshot period label, derived from Datum by default
+    outputDb, outputXlsx: result paths, both are built in a per-run workspace
+                          and replace the previous files only when complete,
+                          concurrent runs with different outputs do not collide
+    registryDb: supplier registry (supplierRegistry.py) caching the supplier list
+                and the supplier name matches across runs, None to load the
+                list from the CSV and match with the LIKE join every run
+    statementsDir: also write one statement workbook per supplier and an index
+                   there (see statements.py)
+    resume: a DB run interrupted during ingest or export keeps its workspace with
+            the checkpointed database, running the same inputs and options again
+            continues from the last committed batch or stage; False starts over
+    xlsxRowLimit: stream the result rows into write-only sheets of at most this
+                  many rows (GXlsxMaxRows is the Excel limit) continued on more
+                  sheets, the per type and total blocks go to a summary sheet
+                  (see WriteSplitToXLSX)
+    """
+    if xlsxRowLimit is not None:
+        checkRowLimit(xlsxRowLimit)
+    if streaming:
+        multipleSources = not isinstance(sourceCsv, str) and len(sourceCsv) > 1
+        if (multipleSources and dedupe is not False) or dedupe:
+            raise ValueError(
+                "Streaming mode does not deduplicate documents, load overlapping exports into the DB")
+        if exactIntegers or scenariosCsv or keepOffsets or statementsDir:
+            raise ValueError(
+                "Streaming mode supports only the standard report")
+        dates = set() if snapshotDb else None
+        with runWorkspace(outputXlsx) as workspace:
+            xlsxName = os.path.join(workspace, os.path.basename(outputXlsx))
+            resRows, totals = buildStreaming(
+                sourceCsv, suppliersCountryCsv, xlsxName, fastScan, dates, xlsxRowLimit)
+            publishOutput(xlsxName, outputXlsx)
+        if snapshotDb:
+            saveRunSnapshot(snapshotDb, sourceCsv, suppliersCountryCsv,
+                            resRows, totals, dates, period=period)
+        return None
+
+    sourceCsvs = [sourceCsv] if isinstance(sourceCsv, str) else list(sourceCsv)
+    key = runKey(sourceCsvs, suppliersCountryCsv, scenariosCsv,
+                 [projected, keepOffsets, dedupe, exactIntegers, fastScan, snapshotDb and os.path.abspath(snapshotDb),
+                  period, os.path.abspath(outputDb), os.path.abspath(outputXlsx), registryDb and os.path.abspath(registryDb),
+                  xlsxRowLimit])
+    with runWorkspace(outputDb, key, resume) as workspace:
+        dbName = os.path.join(workspace, os.path.basename(outputDb))
+        xlsxName = os.path.join(workspace, os.path.basename(outputXlsx))
+        conn = openCheckpointedDB(dbName)
+        try:
+            buildDBFiles(conn, xlsxName, sourceCsv, suppliersCountryCsv, projected, keepOffsets,
+                         scenariosCsv, dedupe, exactIntegers, fastScan, snapshotDb, period, registryDb, xlsxRowLimit)
+        except BaseException:
+            # drop the uncommitted batch, a retry in this process resumes from the checkpoints
+            conn.rollback()
+            raise
+        finally:
+            # closed here, not by the garbage collector, so the DB is not left locked
+            conn.close()
+        publishOutput(xlsxName, outputXlsx)
+        publishOutput(dbName, outputDb)
+
+    if statementsDir:
+        # the process pool is only started when statements are requested
+        from statements import exportStatements
+        exportStatements(outputDb, statementsDir)
+    return os.path.abspath(outputDb)
+
+
+def buildDBFiles(conn, xlsxName, sourceCsv, suppliersCountryCsv, projected, keepOffsets, scenariosCsv,
+                 dedupe, exactIntegers, fastScan, snapshotDb, period, registryDb, xlsxRowLimit=None):
+    # buildDB in the run workspace, conn is the checkpointed DB and xlsxName the
+    # staged workbook; completed stages are recorded in the DB and skipped when a
+    # run resumes
     cursor = conn.cursor()
-    csvToSqlite(cursor, sourceCsv, suppliersCountryCsv)
+    if dedupe is None:
+        dedupe = not isinstance(sourceCsv, str) and len(sourceCsv) > 1
+    if not stageDone(cursor, "ingest"):
+        with profileStage("ingest"):
+            csvToSqlite(cursor, sourceCsv, suppliersCountryCsv,
+                        columns=GReportColumns if projected else None, keepOffsets=keepOffsets, dedupe=dedupe,
+                        fastScan=fastScan, registryDb=registryDb, checkpoints=True)
+        markStageDone(cursor, "ingest")
 
     # DB postprocessing, data preparation
     totalOblec = 0
@@ -259,13 +1458,27 @@ def buildDB(sourceCsv, suppliersCountryCsv):
     # ================================================================================================= #
     # create coefficients table if not already present
     # ================================================================================================= #
+    # the views are created IF NOT EXISTS, the coefficient rows only once
+    viewsDone = stageDone(cursor, "views")
     coeffsTable = "coefficients"
-    createCoeffsTable(cursor, goodsTypeStr, coeffsTable)
+    if not viewsDone:
+        createCoeffsTable(cursor, goodsTypeStr, coeffsTable)
+    if exactIntegers:
+        coeffsTable = "coefficients_mg"
+        if not viewsDone:
+            createCoeffsTableInt(cursor, goodsTypeStr, coeffsTable)
+    unit = "mg" if exactIntegers else "g"
 
     # ================================================================================================= #
     # create a view that joins the main table with the table containing suppliers & country (_CZ_ano_ne)
     # ================================================================================================= #
     joinQueryAll = f"SELECT * FROM {sqlQueryJoinCommonAll}"
+    if registryDb:
+        # matches resolved by the registry, same rows as the LIKE join; CROSS JOIN
+        # keeps suppliedProducts as the outer loop so SUM adds in the same order
+        joinQueryAll = """SELECT sp.*, sc.* FROM suppliedProducts as sp
+    CROSS JOIN supplierMatches as m ON m.Dodavatel = sp.Dodavatel
+    CROSS JOIN suppliersCountry as sc ON sc.rowid = m.supplier_row"""
     crateJoinedViewAll = f"""
     CREATE VIEW IF NOT EXISTS {goodsViewName} AS
     {joinQueryAll}
@@ -282,6 +1495,11 @@ def buildDB(sourceCsv, suppliersCountryCsv):
 
     print(f'caseStr = {caseStr}')
 
+    # exact mode sums quantities as integers (thousandths of a piece)
+    exactSumStr = ""
+    if exactIntegers:
+        exactSumStr = f",\n            SUM(CAST(ROUND({goodsCountStr} * {GQuantityScale}) AS INTEGER)) as total_scaled"
+
     goodsByTypeViewQ = f"""
         CREATE VIEW IF NOT EXISTS {goodsByTypeView} AS
         SELECT
@@ -289,7 +1507,7 @@ def buildDB(sourceCsv, suppliersCountryCsv):
             Dodavatel,
             _CZ_ano_ne,
             {goodsCountStr},
-            SUM({goodsCountStr}) as total_amount
+            SUM({goodsCountStr}) as total_amount{exactSumStr}
         FROM
             {goodsViewName} as gv
         GROUP BY
@@ -317,6 +1535,17 @@ def buildDB(sourceCsv, suppliersCountryCsv):
 
     plasticPaperCartonView = "ekokom_res"
 
+    materialsStr = f"""total_amount * c.koef_plast * 1E6 as 'Plast [g]',
+            total_amount * c.koef_papir * 1E6 as 'Papir [g]',
+            total_amount / c.koef_lepenka * {str(GCartonWeight)} * 1E6 as 'Lepenka [g]'"""
+    if exactIntegers:
+        # mg = scaled amount * mg per piece / scale, carton: scaled amount * carton mg / scaled pieces per carton
+        materialsStr = f"""{sqlRoundDiv('total_scaled * c.mg_plast', GQuantityScale)} as 'Plast [mg]',
+            {sqlRoundDiv('total_scaled * c.mg_papir', GQuantityScale)} as 'Papir [mg]',
+            CASE WHEN c.lepenka_scaled != 0
+                THEN {sqlRoundDiv(f'total_scaled * {GCartonWeightMg}', 'c.lepenka_scaled')}
+            END as 'Lepenka [mg]'"""
+
     plasticPaperCartonViewQ = f"""
     CREATE VIEW IF NOT EXISTS {plasticPaperCartonView} AS
         SELECT
@@ -324,9 +1553,7 @@ def buildDB(sourceCsv, suppliersCountryCsv):
             gv.{goodsTypeStr},
             gv.total_amount,
             gv._CZ_ano_ne as PuvodCZ,
-            total_amount * c.koef_plast * 1E6 as 'Plast [g]',
-            total_amount * c.koef_papir * 1E6 as 'Papir [g]',
-            total_amount / c.koef_lepenka * {str(GCartonWeight)} * 1E6 as 'Lepenka [g]'
+            {materialsStr}
         FROM
             {goodsByTypeView} as gv
         JOIN
@@ -345,9 +1572,9 @@ def buildDB(sourceCsv, suppliersCountryCsv):
     materialsEU_USview = "ekokom_import"
 
     createFilterByCountryView(cursor, materialsCZview,
-                              plasticPaperCartonView, "ano")
+                              plasticPaperCartonView, GScopeFilters["CZ"])
     createFilterByCountryView(cursor, materialsEU_USview,
-                              plasticPaperCartonView, "ne")
+                              plasticPaperCartonView, GScopeFilters["import"])
 
     materialsCZviewObleceni = "ekokom_CZobleceni"
     materialsEU_USviewObleceni = "ekokom_importObleceni"
@@ -360,58 +1587,131 @@ def buildDB(sourceCsv, suppliersCountryCsv):
 
     for t in GgoodsList:
         calcViewTotalsPerType(
-            cursor, f"ekokom_CZ{t.name}", materialsCZview, t.filterStr)
+            cursor, f"ekokom_CZ{t.name}", materialsCZview, t.filterStr, unit)
         materialsCZviewTypes.append(f"ekokom_CZ{t.name}")
         calcViewTotalsPerType(
-            cursor, f"ekokom_import{t.name}", materialsEU_USview, t.filterStr)
+            cursor, f"ekokom_import{t.name}", materialsEU_USview, t.filterStr, unit)
         materialsEU_USviewTypes.append(f"ekokom_import{t.name}")
 
     resultCZview = "ekokom_totalCZ"
     resultEU_USview = "ekokom_totalImport"
 
-    calcViewTotals(cursor, resultCZview, materialsCZview)
-    calcViewTotals(cursor, resultEU_USview, materialsEU_USview)
+    calcViewTotals(cursor, resultCZview, materialsCZview, unit)
+    calcViewTotals(cursor, resultEU_USview, materialsEU_USview, unit)
 
     # PrintOutDemoResult(conn, cursor, totalOblec, totalBoty,
     #                    totalKosme, totalKabel, sqlQueryJoinCommonCZ, goodsTypeStr)
 
     # Commit changes
-    conn.commit()
+    markStageDone(cursor, "views")
     print("CSV data successfully imported into SQLite database!")
 
-    wb = Workbook()
-    # store the name of the "Sheet1" default sheet for later deletion as we create new ones with proper names
-    defaultSheet = wb.active
-    # ws = wb.active
-    WriteToXLSX(cursor, materialsCZview,
-                materialsCZviewTypes, resultCZview, wb)
-    WriteToXLSX(cursor, materialsEU_USview,
-                materialsEU_USviewTypes, resultEU_USview, wb)
+    if not stageDone(cursor, "results"):
+        with profileStage("views"):
+            materializeResults(cursor, plasticPaperCartonView,
+                               {materialsCZview: GScopeFilters["CZ"], materialsEU_USview: GScopeFilters["import"]})
+        markStageDone(cursor, "results")
+
+    if stageDone(cursor, "xlsx") and os.path.exists(xlsxName):
+        print(f"{os.path.basename(xlsxName)} written by the interrupted run")
+    else:
+        if xlsxRowLimit:
+            # rows streamed from the views, nothing is fetched whole; the
+            # summary takes the sums of the total views
+            wb = Workbook(write_only=True)
+            totals = {view: viewTotals(cursor, viewTypes, resultView)
+                      for view, viewTypes, resultView in ((materialsCZview, materialsCZviewTypes, resultCZview),
+                                                          (materialsEU_USview, materialsEU_USviewTypes,
+                                                           resultEU_USview))}
+            with profileStage("xlsx"):
+                WriteSplitToXLSX(wb, ((view, cursor.execute(f"SELECT * FROM {view}")) + totals[view]
+                                      for view in (materialsCZview, materialsEU_USview)),
+                                 xlsxRowLimit, unit)
+        else:
+            wb = Workbook()
+            # store the name of the "Sheet1" default sheet for later deletion as we create new ones with proper names
+            defaultSheet = wb.active
+            # ws = wb.active
+            WriteToXLSX(cursor, materialsCZview,
+                        materialsCZviewTypes, resultCZview, wb, unit)
+            WriteToXLSX(cursor, materialsEU_USview,
+                        materialsEU_USviewTypes, resultEU_USview, wb, unit)
+
+        if scenariosCsv:
+            # numpy is only needed for the what-if evaluation
+            from scenarios import runScenarios
+            with profileStage("scenarios"):
+                runScenarios(cursor, wb, scenariosCsv, goodsByTypeView, GgoodsList, GCartonWeight,
+                             detectEncoding(scenariosCsv))
+
+        if not xlsxRowLimit:
+            wb.remove(defaultSheet)
+        # Uložení souboru
+        with profileStage("xlsx"):
+            wb.save(xlsxName)
+        markStageDone(cursor, "xlsx")
+
+    if snapshotDb and not stageDone(cursor, "snapshot"):
+        resRows = cursor.execute(
+            f"SELECT * FROM {plasticPaperCartonView}").fetchall()
+        totals = {"CZ": cursor.execute(f"SELECT * FROM {resultCZview}").fetchone(),
+                  "import": cursor.execute(f"SELECT * FROM {resultEU_USview}").fetchone()}
+        # Datum is optional, without it the period is None
+        tableColumns = [r[1] for r in cursor.execute(
+            "PRAGMA table_info(suppliedProducts)")]
+        dates = [d for d, in cursor.execute(
+            "SELECT DISTINCT Datum FROM suppliedProducts WHERE Datum IS NOT NULL")] if "Datum" in tableColumns else []
+        saveRunSnapshot(snapshotDb, sourceCsv, suppliersCountryCsv,
+                        resRows, totals, dates, unit, period)
+        markStageDone(cursor, "snapshot")
+
+
+def WriteToXLSX(sqlCursor, materialsView, materialsViewTypes, resultView, wb, unit="g"):
+    # Write data
+    # the views are evaluated here, the queries are the "views" memory stage
+    with profileStage("views"):
+        xlsxEkokomCZquery = f"""
+            SELECT * FROM {materialsView}
+        """
+        rows = sqlCursor.execute(xlsxEkokomCZquery).fetchall()
+        typeTotals, totals = viewTotals(sqlCursor, materialsViewTypes, resultView)
 
-    wb.remove(defaultSheet)
-    # Uložení souboru
-    wb.save("ekokom.xlsx")
+    with profileStage("xlsx"):
+        WriteRowsToXLSX(wb, materialsView, rows, typeTotals, totals, unit)
 
-    # Close connection
-    conn.close()
 
+def viewTotals(sqlCursor, materialsViewTypes, resultView):
+    # (typeTotals, totals) of WriteRowsToXLSX: rows of the ekokom_*<type> views and the total view
+    typeTotals = []
+    for viewType in materialsViewTypes:
+        # print(f'attempting to export {viewType} to xlsx...')
+        qResult = sqlCursor.execute(f"""
+                                 SELECT * FROM {viewType}
+                                 """)
+        typeTotals.append(qResult.fetchall())
 
-def WriteToXLSX(sqlCursor, materialsView, materialsViewTypes, resultView, wb):
+    qResult = sqlCursor.execute(f"""
+                             SELECT * FROM {resultView}
+                             """)
+    return typeTotals, qResult.fetchall()
+
+
+def WriteRowsToXLSX(wb, materialsView, rows, typeTotals, totals, unit="g"):
+    """
+    Sheet `materialsView` with the result rows, per goods type totals
+    (typeTotals[i] = rows of the ekokom_*<type> view of GgoodsList[i]) and
+    the overall totals rows.
+    """
     wb.create_sheet(materialsView)
     ws = wb[materialsView]
 
     # Write header
     ws.append(["Dodavatel", "Kategorie", "Množství", "PůvodCZ",
-              'Plast [g]', 'Papir [g]', 'Lepenka [g]'])
+              f'Plast [{unit}]', f'Papir [{unit}]', f'Lepenka [{unit}]'])
 
     # Write data
-    xlsxEkokomCZquery = f"""
-        SELECT * FROM {materialsView}
-    """
-
-    qResult = sqlCursor.execute(xlsxEkokomCZquery)
     numRows = 1  # excel counts rows from 1
-    for row in qResult.fetchall():
+    for row in rows:
         ws.append(row)
         numRows += 1
 
@@ -441,7 +1741,7 @@ def WriteToXLSX(sqlCursor, materialsView, materialsViewTypes, resultView, wb):
     currentXlsxRow = numRows + 2  # skip two rows to add some space for readability
 
     columnCatnames = ["Kategorie celkem",
-                      'Plast [g]', 'Papir [g]', 'Lepenka [g]']
+                      f'Plast [{unit}]', f'Papir [{unit}]', f'Lepenka [{unit}]']
 
     currentXlsxColumn = 3  # align columns for readability
 
@@ -455,14 +1755,9 @@ def WriteToXLSX(sqlCursor, materialsView, materialsViewTypes, resultView, wb):
     currentXlsxRow += 1
 
     for i, t in enumerate(GgoodsList):
-        # print(f'attempting to export {materialsCZviewTypes[i]} to xlsx...')
-        qResult = sqlCursor.execute(f"""
-                                 SELECT * FROM {materialsViewTypes[i]}
-                                 """)
-
         rowData = []
         rowData.append(f"{t.name}")
-        for q in qResult.fetchall():
+        for q in typeTotals[i]:
             for c in q:
                 rowData.append(c)
 
@@ -486,13 +1781,10 @@ def WriteToXLSX(sqlCursor, materialsView, materialsViewTypes, resultView, wb):
         # ws.append(rowData)
 
     ws.append([""])
-    qResult = sqlCursor.execute(f"""
-                             SELECT * FROM {resultView}
-                             """)
 
     rowData = []
     rowData.append("CELKEM")
-    for q in qResult.fetchall():
+    for q in totals:
         for c in q:
             rowData.append(c)
 
@@ -531,6 +1823,74 @@ def WriteToXLSX(sqlCursor, materialsView, materialsViewTypes, resultView, wb):
         ws.column_dimensions[column_letter].width = adjusted_width
 
 
+def checkRowLimit(rowLimit):
+    # a sheet holds the header and at least one row
+    if not 2 <= rowLimit <= GXlsxMaxRows:
+        raise ValueError(
+            f"Sheet row limit must be between 2 and {GXlsxMaxRows}, got {rowLimit}")
+
+
+def WriteSplitToXLSX(wb, views, rowLimit=GXlsxMaxRows, unit="g"):
+    """
+    Streaming export for results beyond the rows of one sheet. views: (sheet
+    name, ekokom rows, typeTotals, totals) like WriteRowsToXLSX, the rows may be
+    a lazily read cursor and are read once. The rows go to write-only sheets of
+    at most rowLimit rows (header included), continued on <name>_2, <name>_3,
+    ...; the per goods type and total blocks go to the GSummarySheet sheet as
+    given, so they match the ekokom_*<type> and total views to the last digit.
+    """
+    checkRowLimit(rowLimit)
+    boldFont = openpyxl.styles.Font(bold=True)
+
+    def boldRow(ws, values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value)
+            cell.font = boldFont
+            cells.append(cell)
+        return cells
+
+    header = ["Dodavatel", "Kategorie", "Množství", "PůvodCZ",
+              f'Plast [{unit}]', f'Papir [{unit}]', f'Lepenka [{unit}]']
+
+    # first in the workbook, filled once the sheet counts are known
+    summary = wb.create_sheet(GSummarySheet)
+    blocks = []
+    for name, rows, typeTotals, totals in views:
+        sheets = []
+        written = rowLimit
+        for row in rows:
+            if written == rowLimit:
+                ws = wb.create_sheet(name if not sheets else f"{name}_{len(sheets) + 1}")
+                ws.column_dimensions["A"].width = 40
+                ws.column_dimensions["B"].width = 30
+                for col in range(3, len(header) + 1):
+                    ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = len(header[col - 1]) + 6
+                ws.append(boldRow(ws, header))
+                sheets.append(ws)
+                written = 1
+            ws.append(row)
+            written += 1
+
+        if not sheets:
+            ws = wb.create_sheet(name)
+            ws.append(boldRow(ws, header))
+            sheets.append(ws)
+        print(f"{name}: {len(sheets)} sheet(s)")
+        blocks.append((name, [t.name for t in GgoodsList] + ["CELKEM"],
+                       [t[0] for t in typeTotals] + [totals[0]], len(sheets)))
+
+    summary.column_dimensions["A"].width = max(len(n) for n, *_ in blocks) + 2
+    for col in "BCD":
+        summary.column_dimensions[col].width = len(f'Lepenka [{unit}]') + 6
+    for name, labels, sums, sheetCount in blocks:
+        summary.append(boldRow(summary, [name, f'Plast [{unit}]', f'Papir [{unit}]', f'Lepenka [{unit}]']))
+        for label, values in zip(labels, sums):
+            summary.append(boldRow(summary, [label]) + list(values))
+        summary.append([f"Počet listů: {sheetCount}"])
+        summary.append([])
+
+
 def PrintOutDemoResult(conn, cursor, totalOblec, totalBoty, totalKosme, totalKabel, sqlQueryJoinCommonCZ, goodsTypeStr):
     obleceniQuery = (
         f"SELECT * FROM {sqlQueryJoinCommonCZ} AND {goodsTypeStr} LIKE '%obleč%';"
@@ -589,6 +1949,13 @@ def main():
     args = sys.argv
     print(len(args))
 
+    # start-up probe (buildExe.py --benchmark): the GUI records the time-to-ready
+    # once its window is built and closes again
+    if len(args) == 3 and args[1] == STARTUP_PROBE_ARG:
+        runCSVguiProcessCallback(process_callback=buildDB, guiTitle="marian_deserved_EKOkot",
+                                 preview_callback=previewDB, ready_file=args[2])
+        return 0
+
     testPath = "Q1_25_M_Final.csv"
     directory = os.getcwd()
 
@@ -598,7 +1965,7 @@ def main():
         sys.exit(2)
 
     csvFiles = runCSVguiProcessCallback(
-        process_callback=buildDB, guiTitle="marian_deserved_EKOkot")
+        process_callback=buildDB, guiTitle="marian_deserved_EKOkot", preview_callback=previewDB)
     if len(csvFiles) == 0:
         print(f'Failed: {csvFiles}')
     # buildDB(csvData, "dodavatele2.csv")
@@ -609,4 +1976,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # statements.py process pool workers in the frozen executable
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,207 @@
+"""
+Per-stage memory profiling
+--------------------------
+buildDB marks its stages with profileStage(name): "ingest" (csvToSqlite),
+"views" (the view queries - SQLite evaluates views lazily when WriteToXLSX reads
+them), "xlsx" (writing the workbook), "scenarios", "snapshot", and "aggregate"
+in streaming mode. The markers cost nothing unless a MemoryProfiler is active:
+
+    with MemoryProfiler() as profiler:
+        main.buildDB(...)
+    print(formatReport(profiler.results()))
+
+Per stage it records the tracemalloc peak (Python objects), the process RSS peak
+sampled from a background thread (includes SQLite and openpyxl C buffers, needs
+psutil) and the allocation sites still holding memory at the end of the stage
+(tracemalloc snapshot compared to the stage start). A stage entered several
+times (views for CZ and import) is reported once, merged.
+
+See benchmark.py memory for the command line with per-stage budgets.
+"""
+
+import contextlib
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+GActiveProfiler = None
+GSampleInterval = 0.005  # s between RSS samples
+GTopSites = 5
+GSizeUnits = {"": 1, "B": 1, "K": 1 << 10, "KB": 1 << 10,
+              "M": 1 << 20, "MB": 1 << 20, "G": 1 << 30, "GB": 1 << 30}
+
+
+def profileStage(name):
+    # no-op unless a MemoryProfiler is active
+    if GActiveProfiler is None:
+        return contextlib.nullcontext()
+    return GActiveProfiler.stage(name)
+
+
+class MemoryProfiler:
+    def __init__(self, sampleInterval=GSampleInterval, topSites=GTopSites):
+        self.sampleInterval = sampleInterval
+        self.topSites = topSites
+        self.stages = {}
+        # psutil is optional and imported here, main imports this module at start-up
+        try:
+            import psutil
+            self._process = psutil.Process(os.getpid())
+        except ImportError:
+            self._process = None
+        self._rssPeak = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._stage = None
+        # allocations of the profiler itself are not interesting
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                         tracemalloc.Filter(False, __file__)]
+
+    @property
+    def hasRss(self):
+        return self._process is not None
+
+    def __enter__(self):
+        global GActiveProfiler
+        if GActiveProfiler is not None:
+            raise ValueError("A memory profiler is already active")
+        tracemalloc.start()
+        if self._process:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sampleRss, daemon=True)
+            self._sampler.start()
+        GActiveProfiler = self
+        return self
+
+    def __exit__(self, *exc):
+        global GActiveProfiler
+        GActiveProfiler = None
+        if self._sampler:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        tracemalloc.stop()
+        return False
+
+    def _rss(self):
+        return self._process.memory_info().rss
+
+    def _sampleRss(self):
+        while not self._stop.wait(self.sampleInterval):
+            rss = self._rss()
+            with self._lock:
+                self._rssPeak = max(self._rssPeak, rss)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # peaks are reset per stage, stages cannot nest
+        if self._stage is not None:
+            raise ValueError(
+                f"Stage '{name}' started inside stage '{self._stage}'")
+        self._stage = name
+        before = tracemalloc.take_snapshot().filter_traces(self._filters)
+        rssStart = self._rss() if self._process else None
+        with self._lock:
+            self._rssPeak = rssStart or 0
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            rssPeak = None
+            if self._process:
+                rss = self._rss()
+                with self._lock:
+                    rssPeak = max(self._rssPeak, rss)
+            after = tracemalloc.take_snapshot().filter_traces(self._filters)
+            sites = [(str(s.traceback[0]), s.size_diff, s.count_diff)
+                     for s in after.compare_to(before, "lineno") if s.size_diff > 0]
+            self._record(name, seconds, peak, rssStart, rssPeak, sites)
+            self._stage = None
+
+    def _record(self, name, seconds, tracedPeak, rssStart, rssPeak, sites):
+        result = self.stages.get(name)
+        if result is None:
+            self.stages[name] = {"name": name, "calls": 1, "seconds": seconds,
+                                 "tracedPeak": tracedPeak, "rssStart": rssStart,
+                                 "rssPeak": rssPeak, "sites": dict((s[0], s[1:]) for s in sites)}
+            return
+        result["calls"] += 1
+        result["seconds"] += seconds
+        result["tracedPeak"] = max(result["tracedPeak"], tracedPeak)
+        if rssPeak is not None:
+            result["rssPeak"] = max(result["rssPeak"], rssPeak)
+        for site, size, count in sites:
+            oldSize, oldCount = result["sites"].get(site, (0, 0))
+            result["sites"][site] = (oldSize + size, oldCount + count)
+
+    def results(self):
+        """Stage results in execution order, sites cut to the topSites largest."""
+        results = []
+        for result in self.stages.values():
+            result = dict(result)
+            result["sites"] = sorted(((site, size, count) for site, (size, count) in result["sites"].items()),
+                                     key=lambda s: -s[1])[:self.topSites]
+            results.append(result)
+        return results
+
+
+def parseSize(text):
+    # "300MB", "1.5G", "512k", plain bytes
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([a-zA-Z]*)\s*", text)
+    if not match or match.group(2).upper() not in GSizeUnits:
+        raise ValueError(f"Invalid size '{text}'")
+    return int(float(match.group(1)) * GSizeUnits[match.group(2).upper()])
+
+
+def parseBudgets(specs):
+    """["ingest=300MB", ...] -> {stage: bytes}"""
+    budgets = {}
+    for spec in specs:
+        stage, sep, size = spec.partition("=")
+        if not sep or not stage:
+            raise ValueError(f"Invalid budget '{spec}', expected stage=size")
+        budgets[stage.strip()] = parseSize(size)
+    return budgets
+
+
+def budgetMetric(result):
+    # RSS is what runs out on the laptops, traced Python memory without psutil
+    return result["rssPeak"] if result["rssPeak"] is not None else result["tracedPeak"]
+
+
+def checkBudgets(results, budgets):
+    """Returns [(stage, used bytes or None, budget bytes)] of the exceeded budgets, unknown stages fail."""
+    byName = {r["name"]: r for r in results}
+    exceeded = []
+    for stage, budget in budgets.items():
+        result = byName.get(stage)
+        if result is None:
+            exceeded.append((stage, None, budget))
+        elif budgetMetric(result) > budget:
+            exceeded.append((stage, budgetMetric(result), budget))
+    return exceeded
+
+
+def formatSize(size):
+    if size is None:
+        return "-"
+    if abs(size) < 1 << 20:
+        return f"{size / (1 << 10):.1f} KB"
+    return f"{size / (1 << 20):.1f} MB"
+
+
+def formatReport(results):
+    lines = []
+    for r in results:
+        calls = f" x{r['calls']}" if r["calls"] > 1 else ""
+        lines.append(f"{r['name']}{calls}: {r['seconds']:.2f} s, traced peak {formatSize(r['tracedPeak'])}, "
+                     f"RSS {formatSize(r['rssStart'])} -> peak {formatSize(r['rssPeak'])}")
+        for site, size, count in r["sites"]:
+            lines.append(f"    {formatSize(size):>10} {count:>8} blocks  {site}")
+    return "\n".join(lines)
@@ -0,0 +1,152 @@
+"""
+What-if evaluation of packaging coefficients
+--------------------------------------------
+Evaluates many coefficient sets (plast/papir/lepenka per goods type and carton
+weight) over the aggregated quantities in one NumPy product and writes a single
+comparison sheet. Same formulas as the ekokom_res view in main.py.
+
+Scenario file (';' separated like the suppliers list), one scenario per row:
+    Scenar;GCartonWeight;Obleceni_plast;Obleceni_papir;Obleceni_lepenka;Boty_plast;...
+Columns that are missing or empty keep the current value from GgoodsList,
+unknown columns are rejected.
+"""
+
+import csv
+
+import numpy as np
+import openpyxl.styles
+from openpyxl.cell import WriteOnlyCell
+
+GMaterials = ["plast", "papir", "lepenka"]
+GBaseScenarioName = "zaklad"
+
+
+def loadScenariosCsv(path, goodsList, cartonWeight, encoding="utf-8-sig"):
+    """
+    encoding: of the file, main.py passes detectEncoding like for the other inputs
+    Returns (names, coeffs, cartons):
+        coeffs  - array (scenarios, goods types, 3) of plast/papir/lepenka
+        cartons - array (scenarios,) of carton weights
+    The first scenario is always the current configuration (GBaseScenarioName).
+    """
+    base = [[g.plast, g.papir, g.lepenka] for g in goodsList]
+    names = [GBaseScenarioName]
+    coeffs = [base]
+    cartons = [cartonWeight]
+
+    known = {"Scenar", "GCartonWeight"}
+    known.update(f"{g.name}_{m}" for g in goodsList for m in GMaterials)
+
+    with open(path, "r", encoding=encoding, newline="") as file:
+        reader = csv.DictReader(file, delimiter=";")
+        if reader.fieldnames:
+            # BOM of a file read as plain utf8
+            reader.fieldnames = [reader.fieldnames[0].lstrip("\ufeff")] + reader.fieldnames[1:]
+        # a misspelled column would silently keep the current coefficients
+        for column in reader.fieldnames or []:
+            if column.strip() and column.strip() not in known:
+                raise ValueError(
+                    f"Scenario file '{path}' has unknown column '{column.strip()}', "
+                    f"expected Scenar, GCartonWeight or <goods type>_<{'|'.join(GMaterials)}>")
+        for i, row in enumerate(reader, start=1):
+            row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+            scenario = [list(b) for b in base]
+            for gi, g in enumerate(goodsList):
+                for mi, m in enumerate(GMaterials):
+                    value = row.get(f"{g.name}_{m}", "")
+                    if value:
+                        scenario[gi][mi] = float(value.replace(",", "."))
+
+            carton = row.get("GCartonWeight", "")
+            names.append(row.get("Scenar") or f"scenar{i}")
+            coeffs.append(scenario)
+            cartons.append(float(carton.replace(",", "."))
+                           if carton else cartonWeight)
+
+    return names, np.array(coeffs, dtype=np.float64), np.array(cartons, dtype=np.float64)
+
+
+def loadAggregatedQuantities(sqlCursor, goodsByTypeView, goodsList, goodsTypeStr="Typ_zbozi"):
+    """
+    Quantities per (supplier, goods type, CZ/import) row of the grouping view.
+    Returns (quantityMatrix (rows, goods types), isCZ (rows,) bool).
+    """
+    caseStr = "\n".join(
+        [f"WHEN gv.{goodsTypeStr} LIKE '%{t.filterStr}%' THEN {i}" for i, t in enumerate(goodsList)])
+
+    rows = sqlCursor.execute(f"""
+        SELECT
+            CASE
+                {caseStr}
+                ELSE NULL
+            END as goods_idx,
+            gv._CZ_ano_ne LIKE '%ano%' as is_cz,
+            gv._CZ_ano_ne LIKE '%ne%' as is_import,
+            gv.total_amount
+        FROM {goodsByTypeView} as gv
+    """).fetchall()
+    # rows without goods type are dropped by the coefficients join in ekokom_res
+    rows = [r for r in rows if r[0] is not None]
+
+    quantities = np.zeros((len(rows), len(goodsList)), dtype=np.float64)
+    isCZ = np.zeros(len(rows), dtype=bool)
+    isImport = np.zeros(len(rows), dtype=bool)
+    for r, (goodsIdx, cz, imp, amount) in enumerate(rows):
+        quantities[r, goodsIdx] = amount or 0
+        isCZ[r] = bool(cz)
+        isImport[r] = bool(imp)
+
+    return quantities, isCZ, isImport
+
+
+def evaluateScenarios(quantities, coeffs, cartons):
+    """
+    quantities (rows, goods) x coefficients (scenarios, goods) -> grams (3, rows, scenarios)
+    in the order plast, papir, lepenka.
+    """
+    plast = quantities @ coeffs[:, :, 0].T * 1E6
+    papir = quantities @ coeffs[:, :, 1].T * 1E6
+
+    # lepenka = amount / pieces per carton * carton weight, 0 pieces -> NULL in SQL (skipped by SUM)
+    lepenkaPerPiece = np.divide(cartons[:, None], coeffs[:, :, 2],
+                                out=np.zeros_like(coeffs[:, :, 2]), where=coeffs[:, :, 2] != 0)
+    lepenka = quantities @ lepenkaPerPiece.T * 1E6
+
+    return np.stack([plast, papir, lepenka])
+
+
+def WriteScenariosToXLSX(wb, names, grams, isCZ, isImport, sheetName="scenare"):
+    ws = wb.create_sheet(sheetName)
+
+    header = ["Scénář"]
+    header += [f"CZ {m} [g]" for m in GMaterials]
+    header += [f"Import {m} [g]" for m in GMaterials]
+    header += [f"Celkem {m} [g]" for m in GMaterials]
+    # header cells styled before appending, works in write-only workbooks too
+    boldFont = openpyxl.styles.Font(bold=True)
+    headerCells = []
+    for name in header:
+        cell = WriteOnlyCell(ws, name)
+        cell.font = boldFont
+        headerCells.append(cell)
+    ws.append(headerCells)
+
+    totalsCZ = grams[:, isCZ, :].sum(axis=1)
+    totalsImport = grams[:, isImport, :].sum(axis=1)
+
+    for s, name in enumerate(names):
+        cz = totalsCZ[:, s].tolist()
+        imp = totalsImport[:, s].tolist()
+        ws.append([name] + cz + imp + [c + i for c, i in zip(cz, imp)])
+
+    ws.column_dimensions["A"].width = max(len(str(n)) for n in names + ["Scénář"]) + 2
+
+
+def runScenarios(sqlCursor, wb, scenariosCsv, goodsByTypeView, goodsList, cartonWeight, encoding="utf-8-sig"):
+    names, coeffs, cartons = loadScenariosCsv(
+        scenariosCsv, goodsList, cartonWeight, encoding)
+    quantities, isCZ, isImport = loadAggregatedQuantities(
+        sqlCursor, goodsByTypeView, goodsList)
+    grams = evaluateScenarios(quantities, coeffs, cartons)
+    WriteScenariosToXLSX(wb, names, grams, isCZ, isImport)
+    print(f"Evaluated {len(names)} scenarios over {len(quantities)} aggregated rows")
@@ -0,0 +1,300 @@
+"""
+Snapshot history of the EKO-KOM results
+---------------------------------------
+Every run stores its per supplier / goods type aggregates (ekokom_res) and the
+CZ/import totals in a persistent SQLite database (GSnapshotDb, WAL journal),
+tagged with the period of the export (Datum) and a hash of the inputs. Two
+snapshots are compared without the raw exports:
+
+    python snapshots.py list
+    python snapshots.py compare 2024-Q4 2025-Q1 --output porovnani.xlsx
+
+A snapshot is referenced by its id or period (the latest run of the period).
+Running the same inputs again replaces their snapshot. Weights are stored in
+grams whatever unit the run used.
+"""
+
+import argparse
+import datetime
+import hashlib
+import os
+import sqlite3
+import sys
+
+import openpyxl.styles
+from openpyxl import Workbook
+
+GSnapshotDb = "snapshots.db"
+GMaterials = ["plast", "papir", "lepenka"]
+GScopes = ["CZ", "import"]
+# PuvodCZ LIKE '%filter%' of the CZ / import scopes, also the filters of main's report views
+GScopeFilters = {"CZ": "ano", "import": "ne"}
+GDateFormats = ["%d/%m/%Y", "%Y-%m-%d", "%d.%m.%Y"]
+
+
+def openSnapshotStore(path=GSnapshotDb):
+    conn = sqlite3.connect(path)
+    # readers (compare) do not block a run saving its snapshot
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY,
+            period TEXT,
+            input_hash TEXT NOT NULL UNIQUE,
+            created TEXT NOT NULL,
+            sources TEXT
+        );
+        CREATE TABLE IF NOT EXISTS snapshot_rows (
+            snapshot_id INTEGER NOT NULL,
+            Dodavatel TEXT,
+            kategorie TEXT,
+            PuvodCZ TEXT,
+            total_amount REAL,
+            plast_g REAL,
+            papir_g REAL,
+            lepenka_g REAL
+        );
+        CREATE INDEX IF NOT EXISTS snapshot_rows_id ON snapshot_rows(snapshot_id);
+        CREATE TABLE IF NOT EXISTS snapshot_totals (
+            snapshot_id INTEGER NOT NULL,
+            scope TEXT NOT NULL,
+            plast_g REAL,
+            papir_g REAL,
+            lepenka_g REAL,
+            PRIMARY KEY (snapshot_id, scope)
+        );
+    """)
+    return conn
+
+
+def inputHash(paths, goodsList, cartonWeight):
+    """
+    sha256 of the input files and the coefficients - the stored aggregates depend
+    on both, a run with changed coefficients is a new snapshot.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    digest.update(repr([(g.name, g.plast, g.papir, g.lepenka)
+                        for g in goodsList] + [cartonWeight]).encode())
+    return digest.hexdigest()
+
+
+def parseDate(value):
+    for dateFormat in GDateFormats:
+        try:
+            return datetime.datetime.strptime(value.strip(), dateFormat).date()
+        except ValueError:
+            pass
+    return None
+
+
+def periodFromDates(dates):
+    """
+    Period label of the export: 'YYYY-Qn' when all dates fall into one quarter,
+    otherwise 'first..last' date, None without parsable dates.
+    """
+    parsed = [d for d in map(parseDate, dates) if d is not None]
+    if not parsed:
+        return None
+    first, last = min(parsed), max(parsed)
+    if first.year == last.year and (first.month - 1) // 3 == (last.month - 1) // 3:
+        return f"{first.year}-Q{(first.month - 1) // 3 + 1}"
+    return f"{first.isoformat()}..{last.isoformat()}"
+
+
+def saveSnapshot(conn, period, inputDigest, sources, rows, totals):
+    """
+    rows: (Dodavatel, kategorie, PuvodCZ, total_amount, plast, papir, lepenka) in grams
+    totals: {scope: (plast, papir, lepenka)} in grams, scopes GScopes
+    Returns the snapshot id.
+    """
+    with conn:
+        old = conn.execute("SELECT id FROM snapshots WHERE input_hash = ?",
+                           (inputDigest,)).fetchone()
+        if old:
+            conn.execute("DELETE FROM snapshot_rows WHERE snapshot_id = ?", old)
+            conn.execute("DELETE FROM snapshot_totals WHERE snapshot_id = ?", old)
+            conn.execute("DELETE FROM snapshots WHERE id = ?", old)
+
+        snapshotId = conn.execute(
+            "INSERT INTO snapshots (period, input_hash, created, sources) VALUES (?, ?, ?, ?)",
+            (period, inputDigest, datetime.datetime.now().isoformat(timespec="seconds"),
+             ";".join(os.path.basename(s) for s in sources))).lastrowid
+        conn.executemany("INSERT INTO snapshot_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         [(snapshotId,) + tuple(r) for r in rows])
+        conn.executemany("INSERT INTO snapshot_totals VALUES (?, ?, ?, ?, ?)",
+                         [(snapshotId, scope) + tuple(t) for scope, t in totals.items()])
+    return snapshotId
+
+
+def listSnapshots(conn):
+    return conn.execute("""
+        SELECT s.id, s.period, s.created, s.sources, substr(s.input_hash, 1, 12),
+               (SELECT COUNT(*) FROM snapshot_rows WHERE snapshot_id = s.id)
+        FROM snapshots as s ORDER BY s.id
+    """).fetchall()
+
+
+def resolveSnapshot(conn, ref):
+    # id, or period label (latest snapshot of the period)
+    row = None
+    if str(ref).isdigit():
+        row = conn.execute("SELECT id FROM snapshots WHERE id = ?",
+                           (int(ref),)).fetchone()
+    if row is None:
+        row = conn.execute("SELECT id FROM snapshots WHERE period = ? ORDER BY id DESC LIMIT 1",
+                           (str(ref),)).fetchone()
+    if row is None:
+        raise ValueError(f"Snapshot '{ref}' not found")
+    return row[0]
+
+
+def snapshotLabel(conn, snapshotId):
+    period, = conn.execute("SELECT period FROM snapshots WHERE id = ?",
+                           (snapshotId,)).fetchone()
+    return f"#{snapshotId} {period or ''}".strip()
+
+
+def loadSnapshotRows(conn, snapshotId):
+    # {(Dodavatel, kategorie, CZ/import): [amount, plast, papir, lepenka]}, a row
+    # is in a scope when the report counts it there, with the report's LIKE filter
+    values = {}
+    for scope in GScopes:
+        for supplier, category, *numbers in conn.execute("""
+                SELECT Dodavatel, kategorie, total_amount, plast_g, papir_g, lepenka_g
+                FROM snapshot_rows WHERE snapshot_id = ? AND PuvodCZ LIKE '%' || ? || '%'""",
+                (snapshotId, GScopeFilters[scope])):
+            acc = values.setdefault((supplier, category, scope), [0.0] * 4)
+            for i, n in enumerate(numbers):
+                acc[i] += n or 0.0
+    return values
+
+
+def loadSnapshotTotals(conn, snapshotId):
+    return {scope: [v or 0.0 for v in values] for scope, *values in conn.execute(
+        "SELECT scope, plast_g, papir_g, lepenka_g FROM snapshot_totals WHERE snapshot_id = ?",
+        (snapshotId,))}
+
+
+def diffValues(before, after, size):
+    """{key: values} x2 -> sorted [(key, before values, after values, deltas)], missing keys are zeros."""
+    diff = []
+    for key in sorted(set(before) | set(after), key=lambda k: tuple(str(p) for p in k)):
+        b = before.get(key, [0.0] * size)
+        a = after.get(key, [0.0] * size)
+        diff.append((key, b, a, [y - x for x, y in zip(b, a)]))
+    return diff
+
+
+def compareSnapshots(conn, refBefore, refAfter):
+    """
+    Returns (labels, per supplier diff, per category diff, totals diff), values
+    are [amount, plast, papir, lepenka] (totals without amount).
+    """
+    ids = [resolveSnapshot(conn, ref) for ref in (refBefore, refAfter)]
+    before, after = (loadSnapshotRows(conn, i) for i in ids)
+
+    def byCategory(values):
+        grouped = {}
+        for (_, category, scope), numbers in values.items():
+            acc = grouped.setdefault((category, scope), [0.0] * 4)
+            for i, n in enumerate(numbers):
+                acc[i] += n
+        return grouped
+
+    labels = [snapshotLabel(conn, i) for i in ids]
+    return (labels,
+            diffValues(before, after, 4),
+            diffValues(byCategory(before), byCategory(after), 4),
+            diffValues(*({(scope,): v for scope, v in loadSnapshotTotals(conn, i).items()}
+                         for i in ids), 3))
+
+
+def WriteDiffSheet(wb, sheetName, keyHeader, valueNames, labels, diff):
+    ws = wb.create_sheet(sheetName)
+    header = list(keyHeader)
+    for name in valueNames:
+        header += [f"{name} {labels[0]}", f"{name} {labels[1]}", f"{name} rozdíl"]
+    ws.append(header)
+    for key, before, after, delta in diff:
+        row = list(key)
+        for b, a, d in zip(before, after, delta):
+            row += [b, a, d]
+        ws.append(row)
+
+    boldFont = openpyxl.styles.Font(bold=True)
+    for cell in ws[1]:
+        cell.font = boldFont
+    ws.column_dimensions["A"].width = max(
+        [len(str(r[0][0])) for r in diff] + [len(keyHeader[0])]) + 2
+
+
+def WriteComparisonToXLSX(path, labels, supplierDiff, categoryDiff, totalsDiff):
+    wb = Workbook()
+    defaultSheet = wb.active
+    amountNames = ["Množství"] + [f"{m} [g]" for m in GMaterials]
+    WriteDiffSheet(wb, "celkem", ["Původ"], [f"{m} [g]" for m in GMaterials],
+                   labels, totalsDiff)
+    WriteDiffSheet(wb, "kategorie", ["Kategorie", "Původ"], amountNames,
+                   labels, categoryDiff)
+    WriteDiffSheet(wb, "dodavatele", ["Dodavatel", "Kategorie", "Původ"], amountNames,
+                   labels, supplierDiff)
+    wb.remove(defaultSheet)
+    wb.save(path)
+
+
+def runList(args):
+    conn = openSnapshotStore(args.db)
+    try:
+        for snapshotId, period, created, sources, digest, count in listSnapshots(conn):
+            print(f"#{snapshotId:<4} {period or '-':<24} {created}  {count:>5} rows  {digest}  {sources}")
+    finally:
+        conn.close()
+    return True
+
+
+def runCompare(args):
+    conn = openSnapshotStore(args.db)
+    try:
+        labels, supplierDiff, categoryDiff, totalsDiff = compareSnapshots(
+            conn, args.before, args.after)
+    finally:
+        conn.close()
+
+    print(f"{labels[0]} -> {labels[1]}")
+    for (scope,), before, after, delta in totalsDiff:
+        print(f"  {scope:<8}" + "".join(f"  {m} {d:+.1f} g" for m, d in zip(GMaterials, delta)))
+    for (category, scope), before, after, delta in categoryDiff:
+        print(f"  {category or '-':<10} {scope:<7} množství {delta[0]:+.1f}"
+              + "".join(f"  {m} {d:+.1f} g" for m, d in zip(GMaterials, delta[1:])))
+
+    if args.output:
+        WriteComparisonToXLSX(args.output, labels, supplierDiff,
+                              categoryDiff, totalsDiff)
+        print(f"Comparison written to {args.output}")
+    return True
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="EKO-KOM snapshot history")
+    parser.add_argument("--db", default=GSnapshotDb, help="snapshot database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="stored snapshots").set_defaults(run=runList)
+
+    compare = commands.add_parser("compare", help="deltas between two snapshots")
+    compare.add_argument("before", help="snapshot id or period")
+    compare.add_argument("after", help="snapshot id or period")
+    compare.add_argument("--output", help="write the comparison to an xlsx file")
+    compare.set_defaults(run=runCompare)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parseArgs()
+    sys.exit(0 if args.run(args) else 1)
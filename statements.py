@@ -0,0 +1,179 @@
+"""
+Per-supplier statements
+-----------------------
+One workbook per Dodavatel with its ekokom_res rows (quantities and packaging
+weights) and totals, plus an index workbook listing the generated files.
+Suppliers are split into chunks and the workbooks are written in a process
+pool; every worker opens the result database read-only and evaluates ekokom_res
+once per chunk, not once per supplier.
+
+    python statements.py csvimported.db vypisy --workers 4
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl.styles
+import openpyxl.utils
+from openpyxl import Workbook
+
+GStatementsView = "ekokom_res"
+GIndexName = "index.xlsx"
+GChunksPerWorker = 4  # smaller chunks balance the pool, each chunk evaluates the view once
+GMaxFileNameLength = 80
+
+# per worker process, see initWorker
+GWorkerConn = None
+
+
+def statementFileName(supplier, used):
+    """Safe, unique file name for the supplier statement, used: names taken so far."""
+    asciiName = unicodedata.normalize("NFKD", supplier).encode(
+        "ascii", "ignore").decode()
+    base = re.sub(r"[^A-Za-z0-9._-]+", "_", asciiName).strip("._")[:GMaxFileNameLength] or "dodavatel"
+    name = f"{base}.xlsx"
+    counter = 2
+    while name.lower() in used:
+        name = f"{base}_{counter}.xlsx"
+        counter += 1
+    used.add(name.lower())
+    return name
+
+
+def initWorker(dbPath):
+    global GWorkerConn
+    GWorkerConn = sqlite3.connect(f"file:{dbPath}?mode=ro", uri=True)
+
+
+def WriteStatementToXLSX(path, supplier, header, rows):
+    """Statement workbook of one supplier, returns the material totals."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "vypis"
+    ws.append(["Dodavatel", supplier])
+    ws.append([])
+    ws.append(header)
+    for row in rows:
+        ws.append(list(row))
+
+    # material columns follow Dodavatel, Typ_zbozi, total_amount, PuvodCZ
+    totals = [sum(r[i] for r in rows if r[i] is not None)
+              for i in range(4, len(header))]
+    ws.append(["CELKEM", None, sum(r[2] or 0 for r in rows), None] + totals)
+
+    boldFont = openpyxl.styles.Font(bold=True)
+    for cell in ws[1] + ws[3] + ws[ws.max_row]:
+        cell.font = boldFont
+    ws.column_dimensions["A"].width = max(len(str(supplier)), len("Dodavatel")) + 2
+    ws.column_dimensions["B"].width = max(
+        [len(str(r[1])) for r in rows] + [len(header[1])]) + 2
+    for i in range(3, len(header) + 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = len(header[i - 1]) + 4
+
+    # complete files only, a failed run does not leave a truncated statement
+    partPath = path + ".part"
+    wb.save(partPath)
+    os.replace(partPath, path)
+    return totals
+
+
+def writeStatements(chunk, outputDir):
+    """
+    Worker task: chunk is [(Dodavatel, file name)], returns
+    [(Dodavatel, file name, row count, material totals)].
+    """
+    names = dict(chunk)
+    placeholders = ", ".join("?" for _ in names)
+    cursor = GWorkerConn.execute(
+        f"SELECT * FROM {GStatementsView} WHERE Dodavatel IN ({placeholders})", list(names))
+    header = [d[0] for d in cursor.description]
+
+    rowsBySupplier = {}
+    for row in cursor:
+        rowsBySupplier.setdefault(row[0], []).append(row)
+
+    written = []
+    for supplier, fileName in chunk:
+        rows = rowsBySupplier.get(supplier, [])
+        totals = WriteStatementToXLSX(os.path.join(outputDir, fileName), supplier, header, rows)
+        written.append((supplier, fileName, len(rows), totals))
+    return written
+
+
+def WriteIndexToXLSX(path, header, written):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "index"
+    ws.append(["Dodavatel", "Soubor", "Řádků"] + header[4:])
+    for supplier, fileName, count, totals in written:
+        ws.append([supplier, fileName, count] + totals)
+        link = ws.cell(row=ws.max_row, column=2)
+        link.hyperlink = fileName
+        link.style = "Hyperlink"
+
+    boldFont = openpyxl.styles.Font(bold=True)
+    for cell in ws[1]:
+        cell.font = boldFont
+    ws.column_dimensions["A"].width = max([len(str(w[0])) for w in written] + [len("Dodavatel")]) + 2
+    ws.column_dimensions["B"].width = max([len(w[1]) for w in written] + [len("Soubor")]) + 2
+
+    partPath = path + ".part"
+    wb.save(partPath)
+    os.replace(partPath, path)
+
+
+def exportStatements(dbPath, outputDir, workers=None):
+    """
+    Write one statement per supplier of ekokom_res to outputDir and the index
+    (GIndexName). Returns the path of the index.
+    """
+    dbPath = os.path.abspath(dbPath)
+    os.makedirs(outputDir, exist_ok=True)
+
+    conn = sqlite3.connect(f"file:{dbPath}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(f"SELECT * FROM {GStatementsView} LIMIT 0")
+        header = [d[0] for d in cursor.description]
+        suppliers = [s for s, in conn.execute(
+            f"SELECT DISTINCT Dodavatel FROM {GStatementsView} ORDER BY Dodavatel")]
+    finally:
+        conn.close()
+
+    used = {GIndexName.lower()}
+    tasks = [(s, statementFileName(s, used)) for s in suppliers]
+
+    workers = workers or os.cpu_count() or 1
+    chunkCount = max(1, min(len(tasks), workers * GChunksPerWorker))
+    chunks = [tasks[i::chunkCount] for i in range(chunkCount)]
+
+    written = []
+    if not chunks[0]:
+        chunks = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(dbPath,)) as pool:
+        for result in pool.map(writeStatements, chunks, [outputDir] * len(chunks)):
+            written.extend(result)
+    written.sort(key=lambda w: w[0])
+
+    indexPath = os.path.join(outputDir, GIndexName)
+    WriteIndexToXLSX(indexPath, header, written)
+    print(f"{len(written)} supplier statements written to {outputDir}")
+    return indexPath
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Per-supplier EKO-KOM statements")
+    parser.add_argument("db", help="result database of buildDB (csvimported.db)")
+    parser.add_argument("output", help="directory for the statements")
+    parser.add_argument("--workers", type=int, help="worker processes, default CPU count")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parseArgs()
+    exportStatements(args.db, args.output, args.workers)
+    sys.exit(0)
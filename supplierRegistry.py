@@ -0,0 +1,143 @@
+"""
+Supplier registry
+-----------------
+The supplier list (dodavatele2.csv) is master data that rarely changes. The
+registry (GRegistryDb, SQLite in WAL mode) keeps every version of the list keyed
+by the hash of the file, so a known file is never decoded and normalized again,
+and caches which supplier rows match a product Dodavatel
+(`Dodavatel LIKE '%' || Dodavel || '%'`, evaluated by SQLite like the original
+join). A run resolves only the names the registry has not seen with that
+version of the list.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+GRegistryDb = "suppliers.db"
+
+
+def openRegistry(path=GRegistryDb):
+    conn = sqlite3.connect(path)
+    # runs read the registry while another run adds its new names
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS registry_versions (
+            id INTEGER PRIMARY KEY,
+            file_hash TEXT NOT NULL UNIQUE,
+            source TEXT,
+            columns TEXT NOT NULL,
+            loaded TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS registry_suppliers (
+            version_id INTEGER NOT NULL,
+            row_no INTEGER NOT NULL,
+            Dodavel TEXT,
+            _CZ_ano_ne TEXT,
+            row TEXT NOT NULL,
+            PRIMARY KEY (version_id, row_no)
+        );
+        CREATE TABLE IF NOT EXISTS registry_names (
+            version_id INTEGER NOT NULL,
+            Dodavatel TEXT NOT NULL,
+            PRIMARY KEY (version_id, Dodavatel)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS registry_matches (
+            version_id INTEGER NOT NULL,
+            Dodavatel TEXT NOT NULL,
+            row_no INTEGER NOT NULL,
+            PRIMARY KEY (version_id, Dodavatel, row_no)
+        ) WITHOUT ROWID;
+    """)
+    return conn
+
+
+def fileHash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def registerSuppliers(conn, suppliersCsv, readSuppliers):
+    """
+    Version id of the supplier list. readSuppliers(path) -> (normalized columns,
+    rows) is called only when the file content is not in the registry yet.
+    """
+    digest = fileHash(suppliersCsv)
+    row = conn.execute("SELECT id FROM registry_versions WHERE file_hash = ?",
+                       (digest,)).fetchone()
+    if row:
+        return row[0]
+
+    columns, rows = readSuppliers(suppliersCsv)
+    for required in ("Dodavel", "_CZ_ano_ne"):
+        if required not in columns:
+            raise ValueError(
+                f"Supplier list '{suppliersCsv}' has no {required} column")
+    for rowNo, r in enumerate(rows, start=1):
+        if len(r) != len(columns):
+            raise ValueError(
+                f"Supplier list '{suppliersCsv}' row {rowNo} has {len(r)} fields, the header has {len(columns)}")
+    nameIdx = columns.index("Dodavel")
+    countryIdx = columns.index("_CZ_ano_ne")
+
+    with conn:
+        versionId = conn.execute(
+            "INSERT INTO registry_versions (file_hash, source, columns, loaded) VALUES (?, ?, ?, ?)",
+            (digest, os.path.basename(suppliersCsv), json.dumps(columns),
+             datetime.datetime.now().isoformat(timespec="seconds"))).lastrowid
+        conn.executemany("INSERT INTO registry_suppliers VALUES (?, ?, ?, ?, ?)",
+                         [(versionId, rowNo, r[nameIdx], r[countryIdx],
+                           json.dumps(r, ensure_ascii=False))
+                          for rowNo, r in enumerate(rows, start=1)])
+    print(f"Supplier list {os.path.basename(suppliersCsv)} registered as version {versionId}")
+    return versionId
+
+
+def supplierRows(conn, versionId):
+    """(columns, [(row_no, row values)]) of a registered supplier list, in file order."""
+    columns, = conn.execute("SELECT columns FROM registry_versions WHERE id = ?",
+                            (versionId,)).fetchone()
+    rows = [(rowNo, json.loads(row)) for rowNo, row in conn.execute(
+        "SELECT row_no, row FROM registry_suppliers WHERE version_id = ? ORDER BY row_no", (versionId,))]
+    return json.loads(columns), rows
+
+
+def resolveNames(conn, versionId, names):
+    """
+    Match the product supplier names against the supplier list, names already
+    resolved with this version come from the cache.
+    Returns ([(Dodavatel, row_no)] of every matching supplier row ordered by name
+    and row, number of names resolved now).
+    """
+    with conn:
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS run_names (Dodavatel TEXT PRIMARY KEY, seen INTEGER)")
+        conn.execute("DELETE FROM run_names")
+        conn.executemany("INSERT OR IGNORE INTO run_names VALUES (?, 0)",
+                         ((n,) for n in names if n is not None))
+        conn.execute("""
+            UPDATE run_names SET seen = 1 WHERE Dodavatel IN
+                (SELECT Dodavatel FROM registry_names WHERE version_id = ?)""", (versionId,))
+        unseen, = conn.execute(
+            "SELECT COUNT(*) FROM run_names WHERE seen = 0").fetchone()
+
+        if unseen:
+            conn.execute("""
+                INSERT OR IGNORE INTO registry_matches (version_id, Dodavatel, row_no)
+                SELECT s.version_id, n.Dodavatel, s.row_no
+                FROM run_names as n JOIN registry_suppliers as s
+                    ON s.version_id = ? AND n.Dodavatel LIKE '%' || s.Dodavel || '%'
+                WHERE n.seen = 0""", (versionId,))
+            conn.execute("INSERT INTO registry_names SELECT ?, Dodavatel FROM run_names WHERE seen = 0",
+                         (versionId,))
+
+    matches = conn.execute("""
+        SELECT m.Dodavatel, m.row_no FROM run_names as n
+        JOIN registry_matches as m ON m.version_id = ? AND m.Dodavatel = n.Dodavatel
+        ORDER BY m.Dodavatel, m.row_no""", (versionId,)).fetchall()
+    return matches, unseen
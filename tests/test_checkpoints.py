@@ -0,0 +1,169 @@
+"""
+Run workspaces and checkpointed DB runs (main.buildDB): outputs are published
+only when a run completes, concurrent runs do not share files, and a run
+interrupted during ingest keeps its workspace so the same inputs run again in
+the same process resume from the last committed batch.
+
+    python -m pytest -q tests
+"""
+
+import concurrent.futures
+import contextlib
+import functools
+import io
+import os
+import sqlite3
+import sys
+
+import pytest
+
+GRepoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GRepoDir)
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import fastScan
+    import main
+
+GSampleCsv = os.path.join(GRepoDir, "Q1_25_M_Final.csv")
+GSuppliersCsv = os.path.join(GRepoDir, "dodavatele2.csv")
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # small batches and scanner blocks so the sample spans many checkpoints
+    monkeypatch.setattr(main, "GInsertBatchSize", 10)
+    monkeypatch.setattr(main, "GCheckpointBatches", 2)
+    monkeypatch.setattr(main, "scanCsvBlockRanges",
+                        functools.partial(fastScan.scanCsvBlockRanges, blockSize=2048))
+    return tmp_path
+
+
+def interruptAfter(reader, count):
+    # reader yielding `count` items (scanner blocks or rows), then failing mid batch
+    @functools.wraps(reader)
+    def interrupted(*args, **kwargs):
+        for i, item in enumerate(reader(*args, **kwargs)):
+            if i == count:
+                raise Interrupted()
+            yield item
+    return interrupted
+
+
+def build(**kwargs):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        result = main.buildDB(GSampleCsv, GSuppliersCsv, snapshotDb=None, **kwargs)
+    conn = sqlite3.connect(result)
+    try:
+        return (conn.execute("SELECT COUNT(*) FROM suppliedProducts").fetchone(),
+                sorted(conn.execute("SELECT * FROM ekokom_res").fetchall(), key=repr),
+                conn.execute("SELECT * FROM ekokom_totalCZ").fetchone()), out.getvalue()
+    finally:
+        conn.close()
+
+
+def workspaces(workdir):
+    return [n for n in os.listdir(workdir) if n.startswith(main.GWorkspacePrefix)]
+
+
+@pytest.mark.parametrize("reader, count, options", [
+    ("scanCsvBlockRanges", 7, {}),
+    ("scanCsvBlockRanges", 7, {"keepOffsets": True}),
+    ("readCsvWithOffsets", 75, {"keepOffsets": True, "fastScan": False}),
+    ("readSourceRows", 75, {"fastScan": False}),
+])
+def test_resume_interrupted_ingest(workdir, monkeypatch, reader, count, options):
+    expected, _ = build(outputDb="full.db", outputXlsx="full.xlsx", **options)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(main, reader, interruptAfter(getattr(main, reader), count))
+        # the traceback keeps the frames of the failed run alive, like a GUI retry
+        with pytest.raises(Interrupted) as failure:
+            build(**options)
+    workspace, = workspaces(workdir)
+    conn = sqlite3.connect(os.path.join(workdir, workspace, os.path.basename(main.GOutputDb)))
+    try:
+        committed, done = conn.execute("SELECT rows, done FROM checkpointSources").fetchone()
+    finally:
+        conn.close()
+    assert 0 < committed < expected[0][0] and not done
+
+    result, output = build(**options)
+    assert failure.value is not None
+    assert result == expected
+    assert f"resuming after {committed} committed rows" in output
+    assert not workspaces(workdir)
+
+
+def test_prune_stale_workspace(workdir, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(main, "readSourceRows", interruptAfter(main.readSourceRows, 75))
+        with pytest.raises(Interrupted):
+            build(fastScan=False)
+    assert len(workspaces(workdir)) == 1
+
+    # other options, other key: the kept workspace can not be resumed any more
+    build(projected=True)
+    assert not workspaces(workdir)
+
+
+def test_remove_workspace_in_place(workdir, monkeypatch):
+    # where the locked directory can not be renamed (Windows) it is emptied in place
+    workspace = str(workdir / (main.GWorkspacePrefix + "key"))
+    os.makedirs(os.path.join(workspace, "sub"))
+    open(os.path.join(workspace, "csvimported.db"), "w").close()
+    lock = main.lockWorkspace(workspace)
+
+    def replace(src, dst):
+        raise PermissionError(src)
+    monkeypatch.setattr(main.os, "replace", replace)
+    main.removeWorkspace(workspace, lock)
+    assert not workspaces(workdir)
+
+
+def outputs(workdir, *names):
+    return {n: (workdir / n).read_bytes() for n in names}
+
+
+@pytest.mark.parametrize("options", [{}, {"streaming": True}])
+def test_failed_run_keeps_published_outputs(workdir, monkeypatch, options):
+    build(outputDb="out.db", outputXlsx="out.xlsx")
+    published = outputs(workdir, "out.db", "out.xlsx")
+
+    def save(wb, path):
+        raise Interrupted()
+
+    # fails while writing the workbook, after the database is complete
+    with monkeypatch.context() as patch:
+        patch.setattr(main.Workbook, "save", save)
+        with pytest.raises(Interrupted):
+            with contextlib.redirect_stdout(io.StringIO()):
+                main.buildDB(GSampleCsv, GSuppliersCsv, snapshotDb=None, outputDb="out.db",
+                             outputXlsx="out.xlsx", **options)
+    assert outputs(workdir, "out.db", "out.xlsx") == published
+    # only the workspace of the DB run is kept for a resume, nothing is staged next to the outputs
+    assert sorted(set(os.listdir(workdir)) - set(workspaces(workdir))) == ["out.db", "out.xlsx", main.GRegistryDb]
+    assert len(workspaces(workdir)) == (0 if options else 1)
+
+
+def test_concurrent_runs_with_other_outputs(workdir):
+    expected, _ = build(outputDb="full.db", outputXlsx="full.xlsx")
+
+    # the same inputs at once into other outputs: separate workspaces, no shared files
+    def run(i):
+        return main.buildDB(GSampleCsv, GSuppliersCsv, snapshotDb=None, outputDb=f"run{i}.db",
+                            outputXlsx=f"run{i}.xlsx")
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(run, range(4)))
+
+    for result in results:
+        conn = sqlite3.connect(result)
+        try:
+            assert sorted(conn.execute("SELECT * FROM ekokom_res").fetchall(), key=repr) == expected[1]
+        finally:
+            conn.close()
+    assert not workspaces(workdir)
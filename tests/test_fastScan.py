@@ -0,0 +1,104 @@
+"""
+The memory-mapped scanner (fastScan.py) produces the same rows as csv.reader
+over the file opened in text mode, for any block size.
+
+    python -m pytest -q tests
+"""
+
+import csv
+import os
+import random
+import sys
+
+import pytest
+
+GRepoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GRepoDir)
+
+import fastScan
+
+GSampleCsv = os.path.join(GRepoDir, "Q1_25_M_Final.csv")
+GBlockSizes = [1, 2, 3, 5, 8, 13, 64, fastScan.GBlockSize]
+
+
+def readCsvReader(path, encoding="utf-8"):
+    with open(path, "r", encoding=encoding) as file:
+        return list(csv.reader(file))
+
+
+def scanRows(path, encoding="utf-8", blockSize=fastScan.GBlockSize, maxFields=None):
+    offsets, rows = [], []
+    for blockOffsets, blockRows in fastScan.scanCsvBlocks(path, encoding, maxFields=maxFields,
+                                                          blockSize=blockSize):
+        offsets += blockOffsets
+        rows += blockRows
+    return offsets, rows
+
+
+def writeBytes(tmp_path, data):
+    path = tmp_path / "export.csv"
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("data", [
+    b'a,b\n1,2\n',
+    b'a,b\r\n1,2\r\n',
+    b'a,b\n1,2',
+    b'a,"multi\nline",c\n1,2,3\n',
+    b'a,"multi\r\nline\r\n",c\r\n1,2,3\r\n',
+    b'a,"""quoted"" text",c\n"x,y",2,3\n',
+    # a bare quote inside an unquoted field does not open a quoted field
+    b'24" monitor,"note\nsecond line",5\nnext,row,6\n',
+    b'24" monitor,x,5\n"a\nb",c,"d"\n',
+    b'a"b"c,d\n"e"f,g\n',
+    # stray \r is a line break in text mode, also inside a quoted field
+    b'a,b\rc,d\n1,2\n',
+    b'a,"b\rc",d\n1,2\n',
+    b'x"y,"z\r1",2\r3,4\n',
+    # empty lines give empty rows
+    b'a,b\n\n1,2\n\r\n\n',
+    b'a,"b\n\n",c\n\n',
+    b'',
+])
+@pytest.mark.parametrize("blockSize", GBlockSizes)
+def test_scanner_matches_csv_reader(tmp_path, data, blockSize):
+    path = writeBytes(tmp_path, data)
+    offsets, rows = scanRows(path, blockSize=blockSize)
+
+    assert rows == readCsvReader(path)
+    # one offset per record, at the start of a line
+    assert offsets == sorted(set(offsets))
+    assert all(data[o - 1:o] in (b"\n", b"\r") for o in offsets if o)
+
+
+@pytest.mark.parametrize("blockSize", [97, 1024, fastScan.GBlockSize])
+def test_sample_export(blockSize):
+    offsets, rows = scanRows(GSampleCsv, "utf-8-sig", blockSize)
+    assert rows == readCsvReader(GSampleCsv, "utf-8-sig")
+
+    # offsets point at the start of every record
+    with open(GSampleCsv, "rb") as file:
+        data = file.read()
+    assert offsets[0] == 0 and all(data[o - 1:o] == b"\n" for o in offsets[1:])
+
+
+def test_max_fields(tmp_path):
+    path = writeBytes(tmp_path, b'a,b,c,d\n1,2,3,4\n"x",2,"3,3",4\n')
+    _, rows = scanRows(path, maxFields=2)
+    assert [row[:2] for row in rows] == [row[:2] for row in readCsvReader(path)]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_files(tmp_path, seed):
+    rng = random.Random(seed)
+    tokens = [b"a", b"bc", b'"', b'""', b",", b"\n", b"\r\n", b"\r", b" ", "č".encode()]
+    data = b"".join(rng.choice(tokens) for _ in range(rng.randrange(1, 60)))
+    path = writeBytes(tmp_path, data)
+    try:
+        expected = readCsvReader(path)
+    except csv.Error:
+        pytest.skip("csv.reader rejects the file")
+
+    for blockSize in (1, 4, 16, fastScan.GBlockSize):
+        assert scanRows(path, blockSize=blockSize)[1] == expected, (data, blockSize)
@@ -0,0 +1,271 @@
+"""
+buildDB on the sample export (Q1_25_M_Final.csv) and supplier list
+(dodavatele2.csv): input variants, export options and their totals. Every run
+writes its outputs, snapshots and registry to the test's temporary directory.
+
+    python -m pytest -q tests
+"""
+
+import contextlib
+import csv
+import gzip
+import io
+import os
+import re
+import sqlite3
+import sys
+import zipfile
+
+import pytest
+
+GRepoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GRepoDir)
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+    import snapshots
+
+GSampleCsv = os.path.join(GRepoDir, "Q1_25_M_Final.csv")
+GSuppliersCsv = os.path.join(GRepoDir, "dodavatele2.csv")
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def readSample():
+    with open(GSampleCsv, encoding="utf-8-sig", newline="") as file:
+        reader = csv.reader(file)
+        return next(reader), list(reader)
+
+
+def writeCsv(path, header, rows):
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def runBuild(sourceCsv, suppliersCsv=GSuppliersCsv, **kwargs):
+    """buildDB quietly, returns (ekokom_res rows, totals CZ, totals import) or the streaming totals."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = main.buildDB(sourceCsv, suppliersCsv, **kwargs)
+    if kwargs.get("streaming"):
+        return None
+    conn = sqlite3.connect(result)
+    try:
+        return (sorted(conn.execute("SELECT * FROM ekokom_res").fetchall(), key=repr),
+                conn.execute("SELECT * FROM ekokom_totalCZ").fetchone(),
+                conn.execute("SELECT * FROM ekokom_totalImport").fetchone())
+    finally:
+        conn.close()
+
+
+def lastSnapshot():
+    conn = snapshots.openSnapshotStore()
+    try:
+        return conn.execute("SELECT period FROM snapshots ORDER BY id DESC LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("options", [{}, {"projected": True}, {"fastScan": False}])
+def test_export_without_datum(workdir, options):
+    header, rows = readSample()
+    dateIdx = header.index("Datum")
+    noDate = writeCsv(workdir / "nodate.csv", header[:dateIdx] + header[dateIdx + 1:],
+                      [r[:dateIdx] + r[dateIdx + 1:] for r in rows])
+
+    expected = runBuild(GSampleCsv, snapshotDb=None, outputDb="full.db", outputXlsx="full.xlsx")
+    assert runBuild(noDate, **options) == expected
+    assert lastSnapshot() == (None,)
+    assert not [n for n in os.listdir(workdir) if n.startswith(main.GWorkspacePrefix)]
+
+
+def test_streaming_export_without_datum(workdir):
+    header, rows = readSample()
+    dateIdx = header.index("Datum")
+    noDate = writeCsv(workdir / "nodate.csv", header[:dateIdx] + header[dateIdx + 1:],
+                      [r[:dateIdx] + r[dateIdx + 1:] for r in rows])
+
+    runBuild(noDate, streaming=True)
+    assert lastSnapshot() == (None,)
+
+
+def test_xlsx_with_cells_beyond_header(workdir):
+    from openpyxl import Workbook
+    header, rows = readSample()
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    # notes right of the data and a row holding only a note
+    ws.cell(row=3, column=len(header) + 2, value="poznámka")
+    ws.cell(row=len(rows) + 3, column=len(header) + 1, value="kontrola")
+    wb.save(workdir / "notes.xlsx")
+
+    expected = runBuild(GSampleCsv, snapshotDb=None, outputDb="csv.db", outputXlsx="csv.xlsx")
+    assert runBuild(str(workdir / "notes.xlsx"), snapshotDb=None) == expected
+    assert runBuild(str(workdir / "notes.xlsx"), snapshotDb=None, keepOffsets=True,
+                    outputDb="offsets.db", outputXlsx="offsets.xlsx") == expected
+
+
+def test_streaming_matches_db_on_text_quantities(workdir):
+    header, rows = readSample()
+    amountIdx = header.index("Množství celkem")
+    # decimal commas, units and junk are stored as text, SUM() reads their numeric prefix
+    texts = ["1,5", "12 ks", " 3.5", "-2e1x", "abc", ""]
+    rows = [r[:amountIdx] + [texts[i % len(texts)] if i % 3 == 0 else r[amountIdx]] + r[amountIdx + 1:]
+            for i, r in enumerate(rows)]
+    textCsv = writeCsv(workdir / "text.csv", header, rows)
+
+    resRows, totalCZ, totalImport = runBuild(textCsv, snapshotDb=None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        streamRows, streamTotals = main.buildStreaming(textCsv, GSuppliersCsv, "stream.xlsx")
+    assert sorted(streamRows, key=repr) == resRows
+    assert (streamTotals["CZ"], streamTotals["import"]) == (totalCZ, totalImport)
+
+
+def test_overlapping_exports_dedupe(workdir):
+    header, rows = readSample()
+    # monthly exports overlapping in the middle third, one of them in another column order
+    third = len(rows) // 3
+    first = writeCsv(workdir / "m1.csv", header, rows[:2 * third])
+    order = list(reversed(range(len(header))))
+    second = writeCsv(workdir / "m2.csv", [header[i] for i in order],
+                      [[r[i] for i in order] for r in rows[third:]])
+
+    expected = runBuild(GSampleCsv, snapshotDb=None, outputDb="full.db", outputXlsx="full.xlsx")
+    # several exports are deduplicated by default
+    for options in ({}, {"projected": True}, {"fastScan": False}, {"keepOffsets": True}):
+        assert runBuild([first, second], snapshotDb=None, **options) == expected
+    assert runBuild([first, second], snapshotDb=None, dedupe=False) != expected
+
+
+@pytest.mark.parametrize("column, options", [
+    ("Množství celkem", {}),
+    ("Typ_zbozi", {"projected": True}),
+    ("Doklad (VS)", {}),
+])
+def test_later_export_missing_columns(workdir, column, options):
+    header, rows = readSample()
+    idx = header.index(column)
+    partial = writeCsv(workdir / "partial.csv", header[:idx] + header[idx + 1:],
+                       [r[:idx] + r[idx + 1:] for r in rows])
+
+    with pytest.raises(ValueError, match=re.escape(f"partial.csv' is missing columns ['{column}']")):
+        runBuild([GSampleCsv, partial], snapshotDb=None, **options)
+
+
+def readSummary(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        blocks, block = {}, None
+        for row in wb[main.GSummarySheet].iter_rows(values_only=True):
+            if row and row[0] in ("ekokom_CZ", "ekokom_import"):
+                block = blocks.setdefault(row[0], [])
+            elif row and row[0] and block is not None and not row[0].startswith("Počet"):
+                # trailing empty cells are not returned
+                block.append(tuple(row[1:4]) + (None,) * (4 - len(row)))
+        return blocks, [n for n in wb.sheetnames if n != main.GSummarySheet]
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_split_export_summary_matches_views(workdir, streaming):
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = main.buildDB(GSampleCsv, GSuppliersCsv, snapshotDb=None, outputDb="full.db", outputXlsx="full.xlsx")
+    conn = sqlite3.connect(db)
+    try:
+        expected = {scope: [conn.execute(f"SELECT * FROM {scope}{t.name}").fetchone() for t in main.GgoodsList]
+                    + [conn.execute(f"SELECT * FROM {total}").fetchone()]
+                    for scope, total in (("ekokom_CZ", "ekokom_totalCZ"), ("ekokom_import", "ekokom_totalImport"))}
+        counts = [conn.execute(f"SELECT COUNT(*) FROM {scope}").fetchone()[0] for scope in expected]
+    finally:
+        conn.close()
+
+    runBuild(GSampleCsv, snapshotDb=None, streaming=streaming, xlsxRowLimit=10, outputXlsx="split.xlsx")
+    blocks, sheets = readSummary(workdir / "split.xlsx")
+    # the view sums to the 16 significant digits the workbook stores, a sum
+    # recomputed in another order differs in the last digits
+    assert blocks == {scope: [tuple(None if v is None else float(f"{v:.16g}") for v in row) for row in rows]
+                      for scope, rows in expected.items()}
+    assert len(sheets) == sum(-(-n // 9) for n in counts)
+
+
+def test_exact_integer_totals(workdir):
+    header, rows = readSample()
+    reordered = writeCsv(workdir / "reordered.csv", header, rows[::-1])
+    resRows, *grams = runBuild(GSampleCsv, snapshotDb=None, outputDb="g.db", outputXlsx="g.xlsx")
+    exact = runBuild(GSampleCsv, snapshotDb=None, exactIntegers=True)
+
+    # integer milligrams, the same whatever order the rows are summed in
+    totals = exact[1:]
+    assert all(isinstance(v, int) for t in totals for v in t if v is not None)
+    # (ekokom_res shows another Typ_zbozi of a group when the rows come in another order)
+    assert runBuild(reordered, snapshotDb=None, exactIntegers=True,
+                    outputDb="r.db", outputXlsx="r.xlsx")[1:] == totals
+    # every row is rounded to a milligram at most
+    for mg, g in zip(totals, grams):
+        assert all(abs(m - v * 1000) <= 0.5 * len(resRows) for m, v in zip(mg, g) if v is not None)
+
+
+def compressedCopies(workdir, path, encoding=None):
+    data = open(path, "rb").read()
+    if encoding:
+        data = data.decode("utf-8-sig").encode(encoding)
+    gzPath = workdir / "export.csv.gz"
+    with gzip.open(gzPath, "wb") as file:
+        file.write(data)
+    zipPath = workdir / "export.zip"
+    with zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("readme.txt", "export Q1")
+        archive.writestr("export.csv", data)
+    return [str(gzPath), str(zipPath)]
+
+
+@pytest.mark.parametrize("options", [{}, {"projected": True}, {"fastScan": False}])
+def test_compressed_exports(workdir, options):
+    expected = runBuild(GSampleCsv, snapshotDb=None, outputDb="full.db", outputXlsx="full.xlsx", **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        expectedStreaming = main.buildStreaming(GSampleCsv, GSuppliersCsv, "full_stream.xlsx")
+    for path in compressedCopies(workdir, GSampleCsv):
+        assert runBuild(path, snapshotDb=None, **options) == expected
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert main.buildStreaming(path, GSuppliersCsv, "stream.xlsx") == expectedStreaming
+
+
+def test_compressed_export_offsets(workdir):
+    header, rows = readSample()
+    for path in compressedCopies(workdir, GSampleCsv):
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = main.buildDB(path, GSuppliersCsv, snapshotDb=None, projected=True, keepOffsets=True)
+        conn = sqlite3.connect(db)
+        try:
+            # offsets in the decompressed data lead back to the full rows
+            offsets = [o for o, in conn.execute(f'SELECT "{main.GSourceOffsetColumn}" FROM suppliedProducts')]
+            fetched = [main.fetchSourceRow(conn.cursor(), o) for o in offsets]
+        finally:
+            conn.close()
+        assert [list(row.values()) for row in fetched] == rows
+
+
+def test_compressed_cp1250_export(workdir):
+    expected = runBuild(GSampleCsv, snapshotDb=None, outputDb="full.db", outputXlsx="full.xlsx")
+    for path in compressedCopies(workdir, GSampleCsv, "cp1250"):
+        assert runBuild(path, snapshotDb=None) == expected
+
+
+def test_zip_with_several_exports(workdir):
+    path = workdir / "exports.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.write(GSampleCsv, "m1.csv")
+        archive.write(GSampleCsv, "m2.csv")
+    with pytest.raises(ValueError, match="must contain exactly one CSV file"):
+        runBuild(str(path), snapshotDb=None)
@@ -0,0 +1,70 @@
+"""
+Scenario file parsing and evaluation (scenarios.py).
+
+    python -m pytest -q tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scenarios
+
+GGoods = [SimpleNamespace(name="Obleceni", plast=13e-6, papir=0, lepenka=40),
+          SimpleNamespace(name="Boty", plast=0, papir=270e-6, lepenka=8)]
+
+
+def writeScenarios(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_load_scenarios(tmp_path):
+    path = writeScenarios(tmp_path / "scenare.csv",
+                          "Scenar;GCartonWeight;Obleceni_plast;Boty_lepenka;\n"
+                          "lehci;0,02;0,01;\n"
+                          ";;;10\n")
+    names, coeffs, cartons = scenarios.loadScenariosCsv(path, GGoods, 0.05)
+
+    assert names == [scenarios.GBaseScenarioName, "lehci", "scenar2"]
+    assert coeffs[0].tolist() == [[13e-6, 0, 40], [0, 270e-6, 8]]
+    assert coeffs[1].tolist() == [[0.01, 0, 40], [0, 270e-6, 8]]
+    assert coeffs[2].tolist() == [[13e-6, 0, 40], [0, 270e-6, 10]]
+    assert cartons.tolist() == [0.05, 0.02, 0.05]
+
+
+def test_unknown_column(tmp_path):
+    path = writeScenarios(tmp_path / "scenare.csv",
+                          "Scenar;Obleceni_plast;Boty_plastic\nlehci;0,01;0,02\n")
+    with pytest.raises(ValueError, match="'Boty_plastic'"):
+        scenarios.loadScenariosCsv(path, GGoods, 0.05)
+
+
+def test_evaluate_scenarios():
+    quantities = np.array([[2.0, 0.0], [0.0, 16.0]])
+    coeffs = np.array([[[1e-6, 0, 40], [0, 2e-6, 0]]])
+    grams = scenarios.evaluateScenarios(quantities, coeffs, np.array([0.5]))
+
+    assert grams[:, :, 0].tolist() == [[2.0, 0.0], [0.0, 32.0], [25000.0, 0.0]]
+
+
+@pytest.mark.parametrize("encoding", ["cp1250", "utf-8-sig", "utf-8"])
+def test_detected_encoding(tmp_path, encoding):
+    # scenario names with diacritics, saved by Excel in the Windows code page
+    path = tmp_path / "scenare.csv"
+    names = ["lehčí obaly pro oblečení", "žádný karton, jen papírové sáčky", "snížení hmotnosti plastů o čtvrtinu"]
+    path.write_bytes(("Scenar;Obleceni_plast\n" +
+                      "".join(f"{n};0,0{i}\n" for i, n in enumerate(names, start=1))).encode(encoding))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+    loaded, coeffs, _ = scenarios.loadScenariosCsv(str(path), GGoods, 0.05, main.detectEncoding(str(path)))
+
+    assert loaded == [scenarios.GBaseScenarioName] + names
+    assert coeffs[2][0][0] == 0.02
@@ -0,0 +1,29 @@
+"""
+Snapshot history (snapshots.py): the scopes of stored rows follow the report's
+CZ / import filters.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshots
+
+
+def test_rows_scoped_like_report(tmp_path):
+    conn = snapshots.openSnapshotStore(str(tmp_path / "snapshots.db"))
+    try:
+        # the supplier list flags as typed: padded, upper case, unknown, missing
+        flags = [" ano", "ANO ", " ne", "NE", "?", None]
+        rows = [(f"dodavatel{i}", "boty", flag, 1.0, 2.0, 0.0, 3.0) for i, flag in enumerate(flags)]
+        snapshotId = snapshots.saveSnapshot(conn, "2025-Q1", "hash", ["export.csv"], rows, {})
+
+        values = snapshots.loadSnapshotRows(conn, snapshotId)
+        assert sorted(values) == [("dodavatel0", "boty", "CZ"), ("dodavatel1", "boty", "CZ"),
+                                  ("dodavatel2", "boty", "import"), ("dodavatel3", "boty", "import")]
+        assert values[("dodavatel3", "boty", "import")] == [1.0, 2.0, 0.0, 3.0]
+    finally:
+        conn.close()